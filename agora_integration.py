@@ -26,6 +26,9 @@ AGORA_URL      = os.getenv("AGORA_URL",      "").rstrip("/")
 AGORA_USER     = os.getenv("AGORA_USER",     "").strip()
 AGORA_PASSWORD = os.getenv("AGORA_PASSWORD", "").strip()
 DATABASE_URL   = os.getenv("DATABASE_URL",   "")
+# Set by bot.py to its pooled get_conn() so auto-saves reuse the bot's
+# connection pool instead of opening a private connection per call.
+get_conn = None
 
 # MachineId for local bus requests (GetSalesAnalyticsReportRequest etc.)
 AGORA_MACHINE_ID = "582a8d9b-9fba-eae6-75c4-a4658936424f"
@@ -41,6 +44,8 @@ AGORA_SALECENTER_MACHINE_ID = "9067403c-a238-5bc2-d463-be8d23370e65"
 _LUNCH_FRAMES  = {"mediodía", "mediodia", "tarde", "almuerzo", "comida"}
 _DINNER_FRAMES = {"noche", "cena"}
 
+_AUTH_TOKEN_RE = re.compile(r"auth-token=([^;]+)")
+
 
 # =============================================================================
 # Return type
@@ -165,7 +170,7 @@ def _login() -> tuple[str, dict]:
     if status != 200:
         raise RuntimeError(f"Agora login failed: HTTP {status} — {text[:300]}")
 
-    match = re.search(r"auth-token=([^;]+)", set_cookie)
+    match = _AUTH_TOKEN_RE.search(set_cookie)
     if not match:
         raise RuntimeError("Login returned 200 but no auth-token cookie found")
 
@@ -570,16 +575,25 @@ def _aggregate(query_date: str, rows: list[dict]) -> DailySales:
 # and are written separately by bot.py via upsert_full_day().
 # =============================================================================
 
-def _save_to_db(ds: DailySales) -> None:
-    db_url = DATABASE_URL
-    if not db_url:
-        return
+def _connect():
+    """A connection context manager, or None when no DB is configured."""
+    if get_conn is not None:
+        return get_conn()
+    if not DATABASE_URL:
+        return None
     try:
         import psycopg
     except ImportError:
-        return
+        return None
+    return psycopg.connect(DATABASE_URL)
+
+
+def _save_to_db(ds: DailySales) -> None:
     try:
-        with psycopg.connect(db_url) as conn:
+        conn_cm = _connect()
+        if conn_cm is None:
+            return
+        with conn_cm as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     """
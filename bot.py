@@ -1,3 +1,5 @@
+import asyncio
+import atexit
 import json
 import os
 import re
@@ -6,14 +8,18 @@ import time as time_mod
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta, time
 from zoneinfo import ZoneInfo
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache
+from operator import itemgetter
 
 import psycopg
+from psycopg_pool import ConnectionPool
 from flask import Flask, jsonify, request, send_file, make_response, redirect
 from flask_cors import CORS
 from telegram import Update
 from telegram.constants import ChatType
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CommandHandler,
     MessageHandler,
@@ -47,6 +53,13 @@ ALERT_POSITIVE_COVERS_PCT      = float((os.getenv("ALERT_POSITIVE_COVERS_PCT",
 ALERT_TOP_PERCENTILE           = float((os.getenv("ALERT_TOP_PERCENTILE",           "10").strip()  or "10"))
 ALERT_EVENING_HOUR             = int((os.getenv("ALERT_EVENING_HOUR",               "21").strip()  or "21"))
 ALERT_LUNCH_TICKET_MIN = float((os.getenv("ALERT_LUNCH_TICKET_MIN", "35").strip() or "35"))
+# Webhook mode: set WEBHOOK_URL to the public HTTPS base that routes to
+# WEBHOOK_PORT. Unset → long polling (the Flask API keeps PORT either way).
+WEBHOOK_URL    = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")
+WEBHOOK_PORT   = int((os.getenv("WEBHOOK_PORT", "8443").strip() or "8443"))
+WEBHOOK_PATH   = (os.getenv("WEBHOOK_PATH", "telegram").strip().strip("/") or "telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip()
+
 DASHBOARD_API_KEY  = os.getenv("DASHBOARD_API_KEY",  "").strip()
 DASHBOARD_PASSWORD = os.getenv("DASHBOARD_PASSWORD", "").strip()
 
@@ -57,13 +70,17 @@ AGORA_PASSWORD = os.getenv("AGORA_PASSWORD", "").strip()
 ACCESS_MODE = (os.getenv("ACCESS_MODE", "RESTRICTED").strip().upper() or "RESTRICTED")
 ACCESS_MODE = "OPEN" if ACCESS_MODE == "OPEN" else "RESTRICTED"
 
-ALLOWED_USER_IDS = set()
-_raw = os.getenv("ALLOWED_USER_IDS", "").strip()
-if _raw:
-    for x in _raw.split(","):
+def _parse_id_set(env_var: str, default: str = "") -> frozenset[int]:
+    out = set()
+    for x in os.getenv(env_var, default).split(","):
         x = x.strip()
         if x.isdigit():
-            ALLOWED_USER_IDS.add(int(x))
+            out.add(int(x))
+    return frozenset(out)
+
+ALLOWED_USER_IDS = _parse_id_set("ALLOWED_USER_IDS")
+# Both inputs are fixed at startup, so resolve "everyone is admin" once.
+ADMIN_OPEN = ACCESS_MODE == "OPEN" or not ALLOWED_USER_IDS
 
 TZ = ZoneInfo(TZ_NAME)
 
@@ -93,10 +110,13 @@ def _try_agora(day_: date):
     if not _AGORA_AVAILABLE or not AGORA_USER or not AGORA_PASSWORD:
         return None
     try:
-        return _agora_mod.get_daily_sales(day_)
+        ds = _agora_mod.get_daily_sales(day_)
     except Exception as e:
         print(f"Agora fetch failed for {day_}: {e}")
         return None
+    # get_daily_sales() auto-saves the revenue columns to full_daily_stats.
+    invalidate_daily_aggregates(day_)
+    return ds
 
 
 def _try_cm_covers(day_: date) -> dict:
@@ -194,7 +214,7 @@ ROLE_OPS_ADMIN = "OPS_ADMIN"
 ROLE_OWNERS_SILENT = "OWNERS_SILENT"
 ROLE_MANAGER_INPUT = "MANAGER_INPUT"
 ROLE_OWNERS_REQUESTS = "OWNERS_REQUESTS"
-VALID_CHAT_ROLES = {ROLE_OPS_ADMIN, ROLE_OWNERS_SILENT, ROLE_MANAGER_INPUT, ROLE_OWNERS_REQUESTS}
+VALID_CHAT_ROLES = frozenset({ROLE_OPS_ADMIN, ROLE_OWNERS_SILENT, ROLE_MANAGER_INPUT, ROLE_OWNERS_REQUESTS})
 
 # =========================
 # SECURITY / AUTH
@@ -208,13 +228,13 @@ def chat_type(update: Update) -> str | None:
     return c.type if c else None
 
 def is_admin(update: Update) -> bool:
-    if ACCESS_MODE == "OPEN":
-        return True
-    if not ALLOWED_USER_IDS:
+    if ADMIN_OPEN:
         return True
     uid = user_id(update)
     return bool(uid and uid in ALLOWED_USER_IDS)
 
+NOT_AUTHORIZED_TEXT = "Not authorized."
+
 async def guard_admin(update: Update, *, reply_in_private_only: bool = True) -> bool:
     if is_admin(update):
         return True
@@ -222,177 +242,237 @@ async def guard_admin(update: Update, *, reply_in_private_only: bool = True) ->
     if reply_in_private_only and ctype in (ChatType.GROUP, ChatType.SUPERGROUP):
         return False
     if update.message:
-        await update.message.reply_text("Not authorized.")
+        await update.message.reply_text(NOT_AUTHORIZED_TEXT)
     return False
 
 # =========================
 # DATABASE
 # =========================
+DB_POOL_MIN_SIZE = int((os.getenv("DB_POOL_MIN_SIZE", "2").strip() or "2"))
+DB_POOL_MAX_SIZE = int((os.getenv("DB_POOL_MAX_SIZE", "10").strip() or "10"))
+# Seconds a thread waits for a free pooled connection before PoolTimeout.
+DB_POOL_TIMEOUT = float((os.getenv("DB_POOL_TIMEOUT", "30").strip() or "30"))
+# psycopg prepares a statement server-side once it has run this many times on
+# a connection; 0 prepares on first use so pooled connections skip parse/plan.
+DB_PREPARE_THRESHOLD = int((os.getenv("DB_PREPARE_THRESHOLD", "0").strip() or "0"))
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def _get_pool() -> ConnectionPool:
+    """Process-wide pool, opened lazily on first use.
+
+    Shared by the Telegram handlers, the JobQueue jobs and the Flask threads,
+    so it is a sync pool guarded by a lock rather than an async one.
+    """
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                if not DATABASE_URL:
+                    raise RuntimeError("Missing DATABASE_URL")
+                _POOL = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=max(DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE),
+                    kwargs={"prepare_threshold": DB_PREPARE_THRESHOLD},
+                    timeout=DB_POOL_TIMEOUT,
+                    name="norah",
+                    open=True,
+                )
+                atexit.register(_POOL.close)
+    return _POOL
+
 def get_conn():
-    if not DATABASE_URL:
-        raise RuntimeError("Missing DATABASE_URL")
-    return psycopg.connect(DATABASE_URL)
+    # Returns the pool's connection() context manager: `with get_conn() as conn:`
+    # checks a connection out, commits on a clean exit (rolls back on error)
+    # and hands it back to the pool instead of closing it.
+    return _get_pool().connection()
+
+if _AGORA_AVAILABLE:
+    # agora_integration auto-saves to full_daily_stats; route it through the pool.
+    _agora_mod.get_conn = get_conn
+
+# Whole schema as one script: psycopg sends a parameterless multi-statement
+# execute as a single simple-query round-trip. Every statement is idempotent.
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS daily_stats (
+    day DATE PRIMARY KEY,
+    sales DOUBLE PRECISION,
+    covers INTEGER,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+-- Covering index: sum_daily / best_or_worst_day read (day, sales, covers)
+-- straight from the index (index-only scan). The PK stays for ON CONFLICT.
+-- It supersedes the earlier BRIN index, which still needed heap fetches.
+CREATE INDEX IF NOT EXISTS idx_daily_stats_day_covering ON daily_stats(day) INCLUDE (sales, covers);
+DROP INDEX IF EXISTS idx_daily_stats_day_brin;
+
+CREATE TABLE IF NOT EXISTS full_daily_stats (
+    day DATE PRIMARY KEY,
+    total_sales DOUBLE PRECISION,
+    visa DOUBLE PRECISION,
+    cash DOUBLE PRECISION,
+    tips DOUBLE PRECISION,
+
+    lunch_sales DOUBLE PRECISION,
+    lunch_pax INTEGER,
+    lunch_walkins INTEGER,
+    lunch_noshows INTEGER,
+
+    dinner_sales DOUBLE PRECISION,
+    dinner_pax INTEGER,
+    dinner_walkins INTEGER,
+    dinner_noshows INTEGER,
+
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+-- day is the PK, whose btree already serves range scans.
+DROP INDEX IF EXISTS idx_full_daily_stats_day;
+
+-- Event columns
+ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS z_total_sales    DOUBLE PRECISION DEFAULT 0;
+ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS transferencia    DOUBLE PRECISION DEFAULT 0;
+ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS event_pax        INTEGER          DEFAULT 0;
+ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS event_menu_total DOUBLE PRECISION DEFAULT 0;
+ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS event_timeframe  TEXT             DEFAULT '';
+ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS venue_fee        DOUBLE PRECISION DEFAULT 0;
+ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS event_in_cm      BOOLEAN NOT NULL DEFAULT TRUE;
+
+CREATE TABLE IF NOT EXISTS notes_entries (
+    id SERIAL PRIMARY KEY,
+    day DATE NOT NULL,
+    chat_id BIGINT,
+    user_id BIGINT,
+    text TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+-- (day, created_at) matches the ORDER BY of notes_for_day / iter_notes_in_period,
+-- so rows come back in order without a sort; it also serves day-only lookups.
+CREATE INDEX IF NOT EXISTS idx_notes_entries_day_created ON notes_entries(day, created_at);
+DROP INDEX IF EXISTS idx_notes_entries_day;
+-- note_words(text), stored at insert so /noteslast counts words in SQL
+-- instead of re-tokenising every note; init_db() backfills NULLs.
+ALTER TABLE notes_entries ADD COLUMN IF NOT EXISTS words TEXT[];
+-- Trigram index so /findnote's ILIKE '%kw%' is answered from the index.
+-- Optional: without the extension the query still works as a day-range scan.
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS idx_notes_entries_text_trgm ON notes_entries USING gin (text gin_trgm_ops);
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'pg_trgm unavailable, skipping idx_notes_entries_text_trgm: %', SQLERRM;
+END $$;
+
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS chat_roles (
+    chat_id BIGINT PRIMARY KEY,
+    role TEXT NOT NULL,
+    chat_type TEXT,
+    title TEXT,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_chat_roles_role ON chat_roles(role);
+
+CREATE TABLE IF NOT EXISTS daily_product_sales (
+    report_day DATE NOT NULL,
+    product    TEXT NOT NULL,
+    family     TEXT,
+    timeframe  TEXT NOT NULL,
+    quantity   NUMERIC,
+    net        NUMERIC,
+    gross      NUMERIC,
+    PRIMARY KEY (report_day, product, timeframe)
+);
+-- report_day leads the PK, whose btree already serves day lookups/ranges.
+DROP INDEX IF EXISTS idx_dps_day;
+
+CREATE TABLE IF NOT EXISTS daily_server_sales (
+    report_day      DATE NOT NULL,
+    user_name       TEXT NOT NULL,
+    lunch_revenue   NUMERIC,
+    lunch_covers    INTEGER,
+    dinner_revenue  NUMERIC,
+    dinner_covers   INTEGER,
+    total_revenue   NUMERIC,
+    PRIMARY KEY (report_day, user_name)
+);
+-- report_day leads the PK, whose btree already serves day lookups/ranges.
+DROP INDEX IF EXISTS idx_dss_day;
+ALTER TABLE daily_server_sales ADD COLUMN IF NOT EXISTS tips NUMERIC DEFAULT 0;
+ALTER TABLE daily_server_sales ADD COLUMN IF NOT EXISTS food_revenue NUMERIC DEFAULT 0;
+ALTER TABLE daily_server_sales ADD COLUMN IF NOT EXISTS drinks_revenue NUMERIC DEFAULT 0;
+"""
+
+# Bump whenever _SCHEMA_SQL or the data fix in init_db() changes: startup
+# skips both when the database already records this version.
+_SCHEMA_VERSION = "2026-10-16.4"
+_SCHEMA_VERSION_KEY = "schema_version"
 
 def init_db():
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS daily_stats (
-                    day DATE PRIMARY KEY,
-                    sales DOUBLE PRECISION,
-                    covers INTEGER,
-                    created_at TIMESTAMPTZ DEFAULT NOW()
-                );
-                """
-            )
-
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS full_daily_stats (
-                    day DATE PRIMARY KEY,
-                    total_sales DOUBLE PRECISION,
-                    visa DOUBLE PRECISION,
-                    cash DOUBLE PRECISION,
-                    tips DOUBLE PRECISION,
-
-                    lunch_sales DOUBLE PRECISION,
-                    lunch_pax INTEGER,
-                    lunch_walkins INTEGER,
-                    lunch_noshows INTEGER,
-
-                    dinner_sales DOUBLE PRECISION,
-                    dinner_pax INTEGER,
-                    dinner_walkins INTEGER,
-                    dinner_noshows INTEGER,
-
-                    created_at TIMESTAMPTZ DEFAULT NOW()
-                );
-                """
-            )
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_full_daily_stats_day ON full_daily_stats(day);")
-
-            # Add event columns — idempotent, safe on existing DBs
-            for col_ddl in [
-                "ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS z_total_sales    DOUBLE PRECISION DEFAULT 0",
-                "ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS transferencia    DOUBLE PRECISION DEFAULT 0",
-                "ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS event_pax        INTEGER          DEFAULT 0",
-                "ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS event_menu_total DOUBLE PRECISION DEFAULT 0",
-                "ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS event_timeframe  TEXT             DEFAULT ''",
-                "ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS venue_fee        DOUBLE PRECISION DEFAULT 0",
-                "ALTER TABLE full_daily_stats ADD COLUMN IF NOT EXISTS event_in_cm      BOOLEAN NOT NULL DEFAULT TRUE",
-            ]:
-                cur.execute(col_ddl)
-        # Commit DDL before DML so the UPDATE runs in a clean transaction
+        try:
+            with conn.transaction():
+                row = conn.execute(
+                    "SELECT value FROM settings WHERE key=%s;", (_SCHEMA_VERSION_KEY,)
+                ).fetchone()
+        except psycopg.errors.UndefinedTable:
+            row = None  # fresh database
+        if not (row and row[0] == _SCHEMA_VERSION):
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    # Multi-statement script: must go over the simple query protocol
+                    cur.execute(_SCHEMA_SQL, prepare=False)
+            # DDL is committed above, so the data fix runs in a clean transaction
+            with conn.cursor() as cur:
+                # Notes saved before the words column existed
+                cur.execute("SELECT id, text FROM notes_entries WHERE words IS NULL;")
+                backfill = [(note_words(text), id_) for id_, text in cur.fetchall()]
+                if backfill:
+                    cur.executemany("UPDATE notes_entries SET words = %s WHERE id = %s;", backfill)
+                cur.execute(_SQL_UPSERT_SETTING, (_SCHEMA_VERSION_KEY, _SCHEMA_VERSION))
+            conn.commit()
+            print(f"Schema migrated to {_SCHEMA_VERSION}")
+        # May 25 2026: event guests were not booked in CoverManager. Not
+        # version-gated: /deleteday or a re-save can rebuild the row with the
+        # default TRUE, so the override is re-applied on every boot.
+        conn.execute(
+            "UPDATE full_daily_stats SET event_in_cm = FALSE "
+            "WHERE day = '2026-05-25' AND event_in_cm IS DISTINCT FROM FALSE"
+        )
         conn.commit()
-        with conn.cursor() as cur:
-            # May 25 2026: event guests were not booked in CoverManager
-            cur.execute(
-                "UPDATE full_daily_stats SET event_in_cm = FALSE WHERE day = '2026-05-25'"
-            )
-
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS notes_entries (
-                    id SERIAL PRIMARY KEY,
-                    day DATE NOT NULL,
-                    chat_id BIGINT,
-                    user_id BIGINT,
-                    text TEXT NOT NULL,
-                    created_at TIMESTAMPTZ DEFAULT NOW()
-                );
-                """
-            )
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_notes_entries_day ON notes_entries(day);")
-
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT
-                );
-                """
-            )
 
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS chat_roles (
-                    chat_id BIGINT PRIMARY KEY,
-                    role TEXT NOT NULL,
-                    chat_type TEXT,
-                    title TEXT,
-                    updated_at TIMESTAMPTZ DEFAULT NOW()
-                );
-                """
-            )
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_chat_roles_role ON chat_roles(role);")
+# Settings change only via /setowners & co., so reads are served from a
+# small in-process cache. The TTL bounds staleness for manual DB edits.
+SETTINGS_CACHE_TTL_SECONDS = 60.0
+_SETTINGS_CACHE: dict[str, tuple[float, str | None]] = {}
 
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS daily_product_sales (
-                    report_day DATE NOT NULL,
-                    product    TEXT NOT NULL,
-                    family     TEXT,
-                    timeframe  TEXT NOT NULL,
-                    quantity   NUMERIC,
-                    net        NUMERIC,
-                    gross      NUMERIC,
-                    PRIMARY KEY (report_day, product, timeframe)
-                );
-                """
-            )
-            cur.execute(
-                "CREATE INDEX IF NOT EXISTS idx_dps_day ON daily_product_sales(report_day);"
-            )
-
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS daily_server_sales (
-                    report_day      DATE NOT NULL,
-                    user_name       TEXT NOT NULL,
-                    lunch_revenue   NUMERIC,
-                    lunch_covers    INTEGER,
-                    dinner_revenue  NUMERIC,
-                    dinner_covers   INTEGER,
-                    total_revenue   NUMERIC,
-                    PRIMARY KEY (report_day, user_name)
-                );
-                """
-            )
-            cur.execute(
-                "CREATE INDEX IF NOT EXISTS idx_dss_day ON daily_server_sales(report_day);"
-            )
-            # Idempotent column migrations — safe on existing DBs
-            cur.execute(
-                "ALTER TABLE daily_server_sales ADD COLUMN IF NOT EXISTS tips NUMERIC DEFAULT 0;"
-            )
-            cur.execute(
-                "ALTER TABLE daily_server_sales ADD COLUMN IF NOT EXISTS food_revenue NUMERIC DEFAULT 0;"
-            )
-            cur.execute(
-                "ALTER TABLE daily_server_sales ADD COLUMN IF NOT EXISTS drinks_revenue NUMERIC DEFAULT 0;"
-            )
-        conn.commit()
+_SQL_UPSERT_SETTING = """
+    INSERT INTO settings (key, value)
+    VALUES (%s, %s)
+    ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value;
+"""
 
 def set_setting(key: str, value: str):
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO settings (key, value)
-                VALUES (%s, %s)
-                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value;
-                """,
-                (key, value),
-            )
+        conn.execute(_SQL_UPSERT_SETTING, (key, value), prepare=True)
         conn.commit()
+    _SETTINGS_CACHE[key] = (time_mod.monotonic() + SETTINGS_CACHE_TTL_SECONDS, value)
 
 def get_setting(key: str, default: str = "") -> str:
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT value FROM settings WHERE key=%s;", (key,))
-            row = cur.fetchone()
-    return row[0] if row and row[0] is not None else default
+    hit = _SETTINGS_CACHE.get(key)
+    if hit is not None and time_mod.monotonic() < hit[0]:
+        value = hit[1]
+    else:
+        with get_conn() as conn:
+            row = conn.execute("SELECT value FROM settings WHERE key=%s;", (key,), prepare=True).fetchone()
+        value = row[0] if row else None
+        _SETTINGS_CACHE[key] = (time_mod.monotonic() + SETTINGS_CACHE_TTL_SECONDS, value)
+    return value if value is not None else default
 
 def parse_chat_ids(s: str) -> list[int]:
     out: list[int] = []
@@ -406,17 +486,25 @@ def parse_chat_ids(s: str) -> list[int]:
             continue
     return out
 
+# (raw setting value, parsed ids): re-parse only when the stored CSV changes.
+_OWNERS_LEGACY_PARSED: tuple[str, tuple[int, ...]] = ("", ())
+
 def owners_chat_ids_legacy() -> list[int]:
-    return parse_chat_ids(get_setting("OWNERS_CHAT_IDS", ""))
+    global _OWNERS_LEGACY_PARSED
+    raw = get_setting("OWNERS_CHAT_IDS", "")
+    cached_raw, ids = _OWNERS_LEGACY_PARSED
+    if raw != cached_raw:
+        ids = tuple(parse_chat_ids(raw))
+        _OWNERS_LEGACY_PARSED = (raw, ids)
+    return list(ids)
 
 def set_owners_chat_ids_legacy(ids: list[int]):
-    seen = set()
-    uniq = []
-    for x in ids:
-        if x not in seen:
-            uniq.append(x)
-            seen.add(x)
-    set_setting("OWNERS_CHAT_IDS", ",".join(str(x) for x in uniq))
+    global _OWNERS_LEGACY_PARSED
+    uniq = tuple(dict.fromkeys(ids))
+    raw = ",".join(str(x) for x in uniq)
+    set_setting("OWNERS_CHAT_IDS", raw)
+    # We already hold the parsed form of what was just written.
+    _OWNERS_LEGACY_PARSED = (raw, uniq)
 
 def add_owner_chat_legacy(chat_id: int):
     current = owners_chat_ids_legacy()
@@ -428,40 +516,60 @@ def remove_owner_chat_legacy(chat_id: int):
     current = [x for x in owners_chat_ids_legacy() if x != chat_id]
     set_owners_chat_ids_legacy(current)
 
+# Every command hits current_chat_role() and roles change only via /setchatrole,
+# so lookups are cached in-process. set_chat_role() is the only writer of
+# chat_roles and drops the affected entries after commit.
+CHAT_ROLE_CACHE_TTL_SECONDS = 60.0
+CHAT_ROLE_NEGATIVE_TTL_SECONDS = 10.0
+CHAT_ROLE_CACHE_MAX = 10_000
+_CHAT_ROLE_CACHE: dict[int, tuple[float, str | None]] = {}
+_CHATS_WITH_ROLE_CACHE: dict[str, tuple[float, list[int]]] = {}
+
+_SQL_UPSERT_CHAT_ROLE = """
+    INSERT INTO chat_roles (chat_id, role, chat_type, title, updated_at)
+    VALUES (%s, %s, %s, %s, NOW())
+    ON CONFLICT (chat_id) DO UPDATE
+    SET role = EXCLUDED.role,
+        chat_type = EXCLUDED.chat_type,
+        title = EXCLUDED.title,
+        updated_at = NOW();
+"""
+
 def set_chat_role(chat_id: int, role: str, *, ctype: str | None = None, title: str | None = None):
     role = (role or "").strip().upper()
     if role not in VALID_CHAT_ROLES:
         raise ValueError("Invalid chat role")
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO chat_roles (chat_id, role, chat_type, title, updated_at)
-                VALUES (%s, %s, %s, %s, NOW())
-                ON CONFLICT (chat_id) DO UPDATE
-                SET role = EXCLUDED.role,
-                    chat_type = EXCLUDED.chat_type,
-                    title = EXCLUDED.title,
-                    updated_at = NOW();
-                """,
-                (chat_id, role, ctype, title),
-            )
+        conn.execute(_SQL_UPSERT_CHAT_ROLE, (chat_id, role, ctype, title), prepare=True)
         conn.commit()
+    _CHAT_ROLE_CACHE.pop(chat_id, None)
+    _CHATS_WITH_ROLE_CACHE.clear()
 
 def get_chat_role(chat_id: int) -> str | None:
+    hit = _CHAT_ROLE_CACHE.get(chat_id)
+    if hit is not None and time_mod.monotonic() < hit[0]:
+        return hit[1]
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT role FROM chat_roles WHERE chat_id=%s;", (chat_id,))
-            row = cur.fetchone()
-    return row[0] if row else None
+        row = conn.execute("SELECT role FROM chat_roles WHERE chat_id=%s;", (chat_id,), prepare=True).fetchone()
+    role = row[0] if row else None
+    if len(_CHAT_ROLE_CACHE) >= CHAT_ROLE_CACHE_MAX:
+        _CHAT_ROLE_CACHE.clear()
+    ttl = CHAT_ROLE_CACHE_TTL_SECONDS if role is not None else CHAT_ROLE_NEGATIVE_TTL_SECONDS
+    _CHAT_ROLE_CACHE[chat_id] = (time_mod.monotonic() + ttl, role)
+    return role
 
 def chats_with_role(role: str) -> list[int]:
     role = (role or "").strip().upper()
+    hit = _CHATS_WITH_ROLE_CACHE.get(role)
+    if hit is not None and time_mod.monotonic() < hit[0]:
+        return list(hit[1])
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT chat_id FROM chat_roles WHERE role=%s ORDER BY chat_id;", (role,))
-            rows = cur.fetchall()
-    return [int(r[0]) for r in rows] if rows else []
+        rows = conn.execute(
+            "SELECT chat_id FROM chat_roles WHERE role=%s ORDER BY chat_id;", (role,), prepare=True
+        ).fetchall()
+    ids = [int(r[0]) for r in rows] if rows else []
+    _CHATS_WITH_ROLE_CACHE[role] = (time_mod.monotonic() + CHAT_ROLE_CACHE_TTL_SECONDS, ids)
+    return list(ids)
 
 def owners_silent_chat_ids() -> list[int]:
     ids = chats_with_role(ROLE_OWNERS_SILENT)
@@ -469,9 +577,7 @@ def owners_silent_chat_ids() -> list[int]:
 
 def list_all_chats() -> list[tuple[int, str, str | None, str | None]]:
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT chat_id, role, chat_type, title FROM chat_roles ORDER BY role, chat_id;")
-            rows = cur.fetchall()
+        rows = conn.execute("SELECT chat_id, role, chat_type, title FROM chat_roles ORDER BY role, chat_id;").fetchall()
     return [(int(r[0]), r[1], r[2], r[3]) for r in rows] if rows else []
 
 # =========================
@@ -481,20 +587,37 @@ def now_local() -> datetime:
     return datetime.now(TZ)
 
 def business_day_for(ts: datetime) -> date:
-    if ts.hour < CUTOFF_HOUR:
-        return (ts.date() - timedelta(days=1))
-    return ts.date()
+    # Before CUTOFF_HOUR the night still belongs to the previous day; ordinal
+    # arithmetic avoids building a timedelta on every call.
+    return date.fromordinal(ts.toordinal() - (ts.hour < CUTOFF_HOUR))
+
+# (epoch second, business day): handlers, cache expiry checks and the
+# aggregate helpers call business_day_today() many times per update, and the
+# answer only changes at CUTOFF_HOUR, so it is recomputed once per second.
+_BUSINESS_DAY_CACHE: tuple[int, date | None] = (-1, None)
 
 def business_day_today() -> date:
-    return business_day_for(now_local())
+    global _BUSINESS_DAY_CACHE
+    sec = int(time_mod.time())
+    cached_sec, cached_day = _BUSINESS_DAY_CACHE
+    if cached_sec == sec and cached_day is not None:
+        return cached_day
+    day_ = business_day_for(now_local())
+    _BUSINESS_DAY_CACHE = (sec, day_)
+    return day_
 
 def previous_business_day(ts: datetime | None = None) -> date:
     ts = ts or now_local()
     return business_day_for(ts) - timedelta(days=1)
 
+_YMD_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_DMY_RE = re.compile(r"\d{2}/\d{2}/\d{4}")
+_PERIOD_ARG_RE = re.compile(r"(\d+)([MY])")
+
 def normalize_date_separators(s: str) -> str:
     return (s or "").strip().replace("–", "-").replace("—", "-").replace("−", "-")
 
+@lru_cache(maxsize=256)
 def parse_yyyy_mm_dd(s: str) -> date:
     s = normalize_date_separators(s)
     return datetime.strptime(s, "%Y-%m-%d").date()
@@ -505,9 +628,9 @@ def parse_dd_mm_yyyy(s: str) -> date:
 
 def parse_any_date(s: str) -> date:
     s = normalize_date_separators(s)
-    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", s):
+    if _YMD_RE.fullmatch(s):
         return parse_yyyy_mm_dd(s)
-    if re.fullmatch(r"\d{2}/\d{2}/\d{4}", s):
+    if _DMY_RE.fullmatch(s):
         return parse_dd_mm_yyyy(s)
     raise ValueError("Invalid date format")
 
@@ -521,7 +644,7 @@ def add_months(d: date, months: int) -> date:
     last_day = (next_first - timedelta(days=1)).day
     return date(y, m, min(d.day, last_day))
 
-@dataclass
+@dataclass(frozen=True)
 class Period:
     start: date
     end: date
@@ -530,7 +653,7 @@ def parse_period_arg(arg: str) -> int | tuple[str, int]:
     a = (arg or "").strip().upper()
     if a.isdigit():
         return int(a)
-    m = re.fullmatch(r"(\d+)([MY])", a)
+    m = _PERIOD_ARG_RE.fullmatch(a)
     if m:
         n = int(m.group(1))
         unit = m.group(2)
@@ -538,7 +661,11 @@ def parse_period_arg(arg: str) -> int | tuple[str, int]:
     raise ValueError("Invalid period")
 
 def period_ending_today(arg: str) -> Period:
-    end = business_day_today()
+    return _period_ending(business_day_today(), arg)
+
+# Keyed on the business day too, so entries simply stop matching at cutoff.
+@lru_cache(maxsize=64)
+def _period_ending(end: date, arg: str) -> Period:
     spec = parse_period_arg(arg)
     if isinstance(spec, int):
         start = end - timedelta(days=spec - 1) if spec > 0 else end
@@ -556,7 +683,7 @@ def daterange_days(p: Period) -> int:
 # =========================
 # TEXT CLEANING FOR NOTES ANALYTICS
 # =========================
-STOPWORDS = set(
+STOPWORDS = frozenset(
     """
 a an the and or but if then else for to of in on at by with without from as is are was were be been being
 i you he she it we they me him her us them my your his their our this that these those
@@ -565,11 +692,39 @@ test
 """.split()
 )
 
+_TOKEN_KEEP = frozenset("abcdefghijklmnopqrstuvwxyz0123456789áéíóúñüç")
+
+class _TokenTable(dict):
+    """str.translate table that lower-cases and blanks non-word characters in
+    one pass. Entries are filled on first sight of a code point; translating
+    each character's own lower() is exactly text.lower() filtered to
+    _TOKEN_KEEP, for every script."""
+    def __missing__(self, code: int) -> str:
+        out = "".join(ch if ch in _TOKEN_KEEP else " " for ch in chr(code).lower())
+        self[code] = out
+        return out
+
+_TOKEN_TABLE = _TokenTable()
+
+def note_words(text: str) -> list[str]:
+    """Lower-cased words of `text`, before stopword/length filtering."""
+    return (text or "").translate(_TOKEN_TABLE).split()
+
 def tokenize(text: str) -> list[str]:
-    text = (text or "").lower()
-    text = re.sub(r"[^a-z0-9áéíóúñüç]+", " ", text)
-    words = [w.strip() for w in text.split() if w.strip()]
-    return [w for w in words if w not in STOPWORDS and len(w) >= 3]
+    # Length first: it is cheaper than the set lookup and drops most stopwords.
+    return [w for w in note_words(text) if len(w) >= 3 and w not in STOPWORDS]
+
+# Up to this many distinct words, a plain sort beats most_common()'s heap.
+TOP_KEYWORDS_SORT_MAX = 64
+
+def top_keywords(texts, n: int = 12) -> list[tuple[str, int]]:
+    # One tokenize pass over the joined batch: "\n" is a separator, so tokens
+    # never span notes and counts/tie order match per-note Counter.update().
+    counts = Counter(tokenize("\n".join(t or "" for t in texts)))
+    if len(counts) <= TOP_KEYWORDS_SORT_MAX:
+        # sorted() is stable, so ties keep first-seen order like most_common().
+        return sorted(counts.items(), key=itemgetter(1), reverse=True)[:n]
+    return counts.most_common(n)
 
 # =========================
 # NOTE TAG SYSTEM
@@ -598,6 +753,16 @@ def extract_note_tags(text: str) -> list[str]:
             found.append(canonical)
     return found
 
+# Untagged fallback phrases for /soldout and /complaints.
+SOLD_OUT_KEYWORDS = ["sold out", "agotad"]
+COMPLAINT_KEYWORDS = ["complaint", "queja"]
+# One case-insensitive pass per note instead of lower() + a scan per keyword.
+_SOLD_OUT_RE = re.compile("|".join(map(re.escape, SOLD_OUT_KEYWORDS)), re.IGNORECASE)
+_COMPLAINT_RE = re.compile("|".join(map(re.escape, COMPLAINT_KEYWORDS)), re.IGNORECASE)
+# Untagged fallback phrases for /staffnotes.
+STAFF_KEYWORDS = ["staff", "personal", "sick", "enfermo", "ausente", "absent", "late", "tarde"]
+_STAFF_RE = re.compile("|".join(map(re.escape, STAFF_KEYWORDS)), re.IGNORECASE)
+
 def extract_tag_content(text: str, tag: str) -> str:
     tl = text.lower()
     aliases = NOTE_TAGS.get(tag, [])
@@ -607,87 +772,300 @@ def extract_tag_content(text: str, tag: str) -> str:
             return text[idx + len(alias):].strip()
     return text.strip()
 
+def tag_contents(rows, tag: str) -> list[str]:
+    """extract_tag_content() of every note in `rows` that carries `tag`.
+
+    Same result as filtering on extract_note_tags() and then extracting, but
+    each note is lower-cased and scanned for the aliases once.
+    """
+    aliases = NOTE_TAGS.get(tag, [])
+    out = []
+    for _, txt in rows:
+        tl = (txt or "").lower()
+        for alias in aliases:
+            idx = tl.find(alias)
+            if idx != -1:
+                out.append(txt[idx + len(alias):].strip())
+                break
+    return out
+
 def notes_have_any_tag(rows: list[tuple]) -> bool:
     return any(extract_note_tags(txt) for _, txt in rows)
 
+# Period aggregates (sum_daily, sum_full_in_period, best_or_worst_day) keyed
+# by (kind, start, end, ...). Closed periods never expire; they are dropped
+# only by invalidate_daily_aggregates(), which this process's writers call
+# after committing to daily_stats or full_daily_stats. Writes from outside the
+# process (a manual SQL fix, a second bot instance) are not seen: closed
+# entries stay stale until they fall out of the LRU or the bot restarts. Periods
+# that reach the current business day also expire after
+# DAILY_AGG_CACHE_TTL_SECONDS. /range
+# and the dashboard can ask for any number of distinct periods, so the cache
+# is an LRU of at most DAILY_AGG_CACHE_MAX entries.
+#
+# Readers run in to_thread workers and Flask threads, so every access holds
+# _DAILY_AGG_LOCK. A reader takes _agg_cache_gen() before its query and hands
+# it to _agg_cache_put(); invalidate_daily_aggregates() bumps the generation,
+# so a result read before a concurrent write commits is returned but never
+# cached.
+DAILY_AGG_CACHE_TTL_SECONDS = 60.0
+DAILY_AGG_CACHE_MAX = 10_000
+_DAILY_AGG_CACHE: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+_DAILY_AGG_LOCK = threading.Lock()
+_DAILY_AGG_GEN = 0
+
+def _agg_cache_gen() -> int:
+    return _DAILY_AGG_GEN
+
+def _agg_cache_get(key: tuple) -> tuple[float, object] | None:
+    """Fresh (expires, value) entry for `key`, or None on a miss.
+
+    Returning the entry rather than the value lets None results (e.g. no
+    best day in an empty period) be cached too.
+    """
+    with _DAILY_AGG_LOCK:
+        hit = _DAILY_AGG_CACHE.get(key)
+        if hit is not None and time_mod.monotonic() < hit[0]:
+            _DAILY_AGG_CACHE.move_to_end(key)
+            return hit
+    return None
+
+def _agg_cache_put(key: tuple, p: Period, value, gen: int):
+    """Store `value` unless a write invalidated aggregates since `gen`; returns `value`."""
+    if p.end < business_day_today():
+        expires = float("inf")
+    else:
+        expires = time_mod.monotonic() + DAILY_AGG_CACHE_TTL_SECONDS
+    with _DAILY_AGG_LOCK:
+        if gen != _DAILY_AGG_GEN:
+            return value
+        _DAILY_AGG_CACHE[key] = (expires, value)
+        _DAILY_AGG_CACHE.move_to_end(key)
+        while len(_DAILY_AGG_CACHE) > DAILY_AGG_CACHE_MAX:
+            _DAILY_AGG_CACHE.popitem(last=False)
+    return value
+
+def invalidate_daily_aggregates(day_: date | None = None):
+    """Drop cached aggregates covering `day_` (all of them when None).
+
+    Periods that don't contain the written day keep their entry, including
+    cached empty results, so a write never forces unrelated recomputation.
+    """
+    global _DAILY_AGG_GEN
+    with _DAILY_AGG_LOCK:
+        _DAILY_AGG_GEN += 1
+        if day_ is None:
+            _DAILY_AGG_CACHE.clear()
+            _WEEKLY_DIGEST_CACHE.clear()
+            return
+        for key in [k for k in _DAILY_AGG_CACHE if k[1] <= day_ <= k[2]]:
+            del _DAILY_AGG_CACHE[key]
+        # A digest also compares against the week before its own.
+        for key in [k for k in _WEEKLY_DIGEST_CACHE if k[0] - timedelta(days=7) <= day_ <= k[1]]:
+            del _WEEKLY_DIGEST_CACHE[key]
+
+_SQL_UPSERT_DAILY = """
+    INSERT INTO daily_stats (day, sales, covers)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (day)
+    DO UPDATE SET sales = EXCLUDED.sales, covers = EXCLUDED.covers
+    RETURNING sales, covers;
+"""
+
 def upsert_daily(day_: date, sales: float, covers: int):
+    """Write the day's row and return the stored (sales, covers)."""
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO daily_stats (day, sales, covers)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (day)
-                DO UPDATE SET sales = EXCLUDED.sales, covers = EXCLUDED.covers;
-                """,
-                (day_, sales, covers),
-            )
+        row = conn.execute(_SQL_UPSERT_DAILY, (day_, sales, covers), prepare=True).fetchone()
         conn.commit()
+    invalidate_daily_aggregates(day_)
+    return row
 
 def get_daily(day_: date):
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT sales, covers FROM daily_stats WHERE day=%s;", (day_,))
-            row = cur.fetchone()
+        row = conn.execute("SELECT sales, covers FROM daily_stats WHERE day=%s;", (day_,), prepare=True).fetchone()
     return row
 
 def sum_daily(p: Period):
+    hit = _agg_cache_get(("daily", p.start, p.end))
+    if hit is not None:
+        return hit[1]
+    gen = _agg_cache_gen()
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT COALESCE(SUM(sales),0), COALESCE(SUM(covers),0), COUNT(*)
-                FROM daily_stats
-                WHERE day BETWEEN %s AND %s;
-                """,
-                (p.start, p.end),
-            )
-            row = cur.fetchone()
+        row = conn.execute(
+            """
+            SELECT COALESCE(SUM(sales),0), COALESCE(SUM(covers),0), COUNT(*)
+            FROM daily_stats
+            WHERE day BETWEEN %s AND %s;
+            """,
+            (p.start, p.end),
+            prepare=True,
+        ).fetchone()
+    return _cache_daily_sums(p, row, gen)
+
+def _cache_daily_sums(p: Period, row, gen: int) -> tuple[float, int, int]:
+    """Normalise a (sales, covers, days) SUM row and store it for sum_daily()."""
     total_sales, total_covers, days_with_data = row
-    return float(total_sales), int(total_covers), int(days_with_data)
+    result = (float(total_sales), int(total_covers), int(days_with_data))
+    return _agg_cache_put(("daily", p.start, p.end), p, result, gen)
 
 def best_or_worst_day(p: Period, worst: bool = False):
+    hit = _agg_cache_get(("best", p.start, p.end, worst))
+    if hit is not None:
+        return hit[1]
+    gen = _agg_cache_gen()
     order = "ASC" if worst else "DESC"
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                f"""
-                SELECT day, sales, covers
-                FROM daily_stats
-                WHERE day BETWEEN %s AND %s AND sales IS NOT NULL
-                ORDER BY sales {order}
-                LIMIT 1;
-                """,
-                (p.start, p.end),
-            )
-            row = cur.fetchone()
-    return row
+        row = conn.execute(
+            f"""
+            SELECT day, sales, covers
+            FROM daily_stats
+            WHERE day BETWEEN %s AND %s AND sales IS NOT NULL
+            ORDER BY sales {order}
+            LIMIT 1;
+            """,
+            (p.start, p.end),
+            prepare=True,
+        ).fetchone()
+    return _agg_cache_put(("best", p.start, p.end, worst), p, row, gen)
+
+_SQL_INSERT_NOTE = """
+    INSERT INTO notes_entries (day, chat_id, user_id, text, words)
+    VALUES (%s, %s, %s, %s, %s);
+"""
 
 def insert_note_entry(day_: date, chat_id: int, user_id: int, text: str):
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO notes_entries (day, chat_id, user_id, text)
-                VALUES (%s, %s, %s, %s);
-                """,
-                (day_, chat_id, user_id, text),
-            )
+        conn.execute(
+            _SQL_INSERT_NOTE, (day_, chat_id, user_id, text, note_words(text)), prepare=True
+        )
         conn.commit()
 
 def notes_for_day(day_: date) -> list[str]:
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT text FROM notes_entries WHERE day=%s ORDER BY created_at ASC;",
-                (day_,),
-            )
-            rows = cur.fetchall()
+        rows = conn.execute(
+            "SELECT text FROM notes_entries WHERE day=%s ORDER BY created_at ASC;",
+            (day_,),
+            prepare=True,
+        ).fetchall()
     return [r[0] for r in rows]
 
-def notes_in_period(p: Period) -> list[tuple[date, str]]:
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def find_note_days(p: Period, keyword: str, limit: int = 10) -> list[date]:
+    """Most recent `limit` distinct days in `p` whose notes contain `keyword`
+    (case-insensitive), oldest first."""
     with get_conn() as conn:
-        with conn.cursor() as cur:
+        rows = conn.execute(
+            """
+            SELECT day FROM (
+                SELECT DISTINCT day
+                FROM notes_entries
+                WHERE day BETWEEN %s AND %s AND text ILIKE %s
+                ORDER BY day DESC
+                LIMIT %s
+            ) recent
+            ORDER BY day ASC;
+            """,
+            (p.start, p.end, f"%{_like_escape(keyword)}%", limit),
+            prepare=True,
+        ).fetchall()
+    return [r[0] for r in rows]
+
+def notes_matching(p: Period, needles: list[str]) -> list[tuple[date, str]]:
+    """Notes in `p` whose text contains any of `needles` (case-insensitive)."""
+    patterns = [f"%{_like_escape(n)}%" for n in needles]
+    with get_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT day, text
+            FROM notes_entries
+            WHERE day BETWEEN %s AND %s AND text ILIKE ANY(%s)
+            ORDER BY day ASC, created_at ASC;
+            """,
+            (p.start, p.end, patterns),
+            prepare=True,
+        ).fetchall()
+    return [(r[0], r[1]) for r in rows]
+
+def tag_keyword_counts(p: Period, tag: str, keywords: list[str], keyword_re) -> tuple[bool, int, list[tuple[str, int]]]:
+    """(any candidate notes, notes tagged `tag`, top keywords) for /soldout and /complaints.
+
+    Only notes matching a tag alias or a fallback keyword leave the DB. Top
+    keywords come from the tagged content, or from the keyword matches when
+    nothing is tagged. Runs in a worker thread, fetch and counting alike.
+    """
+    rows = notes_matching(p, NOTE_TAGS[tag] + keywords)
+    tagged = tag_contents(rows, tag)
+    if tagged:
+        return True, len(tagged), top_keywords(tagged)
+    return bool(rows), 0, top_keywords(txt for _, txt in rows if txt and keyword_re.search(txt))
+
+def notes_exist_in_period(p: Period) -> bool:
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM notes_entries WHERE day BETWEEN %s AND %s);",
+            (p.start, p.end),
+            prepare=True,
+        ).fetchone()
+    return bool(row[0])
+
+def latest_notes_in_period(p: Period, limit: int) -> tuple[int, list[tuple[date, str]]]:
+    """(total notes in `p`, the last `limit` of them oldest first)."""
+    with get_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT day, text, COUNT(*) OVER ()
+            FROM notes_entries
+            WHERE day BETWEEN %s AND %s
+            ORDER BY day DESC, created_at DESC
+            LIMIT %s;
+            """,
+            (p.start, p.end, limit),
+            prepare=True,
+        ).fetchall()
+    total = int(rows[0][2]) if rows else 0
+    return total, [(r[0], r[1]) for r in reversed(rows)]
+
+def top_note_words(p: Period, n: int = 12) -> list[tuple[str, int]]:
+    """top_keywords() over every note in `p`, computed from the stored words.
+
+    Ties keep Counter.most_common order: first appearance by (day,
+    created_at, position in note).
+    """
+    with get_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT w, COUNT(*) AS cnt
+            FROM notes_entries ne
+            CROSS JOIN LATERAL unnest(ne.words) WITH ORDINALITY AS u(w, pos)
+            WHERE ne.day BETWEEN %s AND %s
+              AND char_length(w) >= 3 AND w <> ALL(%s)
+            GROUP BY w
+            ORDER BY cnt DESC, MIN(ARRAY[
+                (ne.day - DATE '2000-01-01')::float8,
+                EXTRACT(EPOCH FROM ne.created_at)::float8,
+                pos::float8
+            ])
+            LIMIT %s;
+            """,
+            (p.start, p.end, list(STOPWORDS), n),
+            prepare=True,
+        ).fetchall()
+    return [(r[0], int(r[1])) for r in rows]
+
+# Rows fetched per round-trip when streaming notes through a server-side cursor.
+NOTES_STREAM_ITERSIZE = 2000
+
+def iter_notes_in_period(p: Period):
+    """(day, text) for every note in `p`, oldest first.
+
+    Streams through a server-side cursor, NOTES_STREAM_ITERSIZE rows per
+    round-trip, so a 1Y window is never held in memory whole.
+    """
+    with get_conn() as conn:
+        with conn.cursor(name="notes_in_period") as cur:
+            cur.itersize = NOTES_STREAM_ITERSIZE
             cur.execute(
                 """
                 SELECT day, text
@@ -697,10 +1075,67 @@ def notes_in_period(p: Period) -> list[tuple[date, str]]:
                 """,
                 (p.start, p.end),
             )
-            rows = cur.fetchall()
-    return [(r[0], r[1]) for r in rows]
+            yield from cur
+
+def note_tag_counts(p: Period) -> tuple[int, dict[str, int], int]:
+    """(notes in `p`, notes per tag, untagged notes) for /tagstats."""
+    counts = {tag: 0 for tag in NOTE_TAGS}
+    total = untagged = 0
+    for _, txt in iter_notes_in_period(p):
+        total += 1
+        found = extract_note_tags(txt)
+        if found:
+            for tag in found:
+                counts[tag] += 1
+        else:
+            untagged += 1
+    return total, counts, untagged
+
+def staff_notes_in_period(p: Period):
+    """(notes in `p`, [STAFF] notes, their last 10, last 5 keyword matches)."""
+    total = n_tagged = 0
+    tagged: deque = deque(maxlen=10)
+    keyword_matches: deque = deque(maxlen=5)
+    for d, txt in iter_notes_in_period(p):
+        total += 1
+        if "STAFF" in extract_note_tags(txt):
+            n_tagged += 1
+            tagged.append((d, txt))
+        elif not n_tagged and txt and _STAFF_RE.search(txt):
+            keyword_matches.append((d, txt))
+    return total, n_tagged, list(tagged), list(keyword_matches)
 
 # ---- FULL DAILY QUERIES ----
+_SQL_UPSERT_FULL_DAY = """
+    INSERT INTO full_daily_stats (
+        day, total_sales, visa, cash, tips,
+        lunch_sales, lunch_pax, lunch_walkins, lunch_noshows,
+        dinner_sales, dinner_pax, dinner_walkins, dinner_noshows,
+        z_total_sales, transferencia, event_pax,
+        event_menu_total, event_timeframe, venue_fee, event_in_cm
+    )
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    ON CONFLICT (day) DO UPDATE SET
+        total_sales=EXCLUDED.total_sales,
+        visa=EXCLUDED.visa,
+        cash=EXCLUDED.cash,
+        tips=EXCLUDED.tips,
+        lunch_sales=EXCLUDED.lunch_sales,
+        lunch_pax=EXCLUDED.lunch_pax,
+        lunch_walkins=EXCLUDED.lunch_walkins,
+        lunch_noshows=EXCLUDED.lunch_noshows,
+        dinner_sales=EXCLUDED.dinner_sales,
+        dinner_pax=EXCLUDED.dinner_pax,
+        dinner_walkins=EXCLUDED.dinner_walkins,
+        dinner_noshows=EXCLUDED.dinner_noshows,
+        z_total_sales=EXCLUDED.z_total_sales,
+        transferencia=EXCLUDED.transferencia,
+        event_pax=EXCLUDED.event_pax,
+        event_menu_total=EXCLUDED.event_menu_total,
+        event_timeframe=EXCLUDED.event_timeframe,
+        venue_fee=EXCLUDED.venue_fee;
+"""
+
 def upsert_full_day(
     day_: date,
     total_sales: float,
@@ -724,46 +1159,19 @@ def upsert_full_day(
     event_in_cm:      bool  = True,
 ):
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO full_daily_stats (
-                    day, total_sales, visa, cash, tips,
-                    lunch_sales, lunch_pax, lunch_walkins, lunch_noshows,
-                    dinner_sales, dinner_pax, dinner_walkins, dinner_noshows,
-                    z_total_sales, transferencia, event_pax,
-                    event_menu_total, event_timeframe, venue_fee, event_in_cm
-                )
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                ON CONFLICT (day) DO UPDATE SET
-                    total_sales=EXCLUDED.total_sales,
-                    visa=EXCLUDED.visa,
-                    cash=EXCLUDED.cash,
-                    tips=EXCLUDED.tips,
-                    lunch_sales=EXCLUDED.lunch_sales,
-                    lunch_pax=EXCLUDED.lunch_pax,
-                    lunch_walkins=EXCLUDED.lunch_walkins,
-                    lunch_noshows=EXCLUDED.lunch_noshows,
-                    dinner_sales=EXCLUDED.dinner_sales,
-                    dinner_pax=EXCLUDED.dinner_pax,
-                    dinner_walkins=EXCLUDED.dinner_walkins,
-                    dinner_noshows=EXCLUDED.dinner_noshows,
-                    z_total_sales=EXCLUDED.z_total_sales,
-                    transferencia=EXCLUDED.transferencia,
-                    event_pax=EXCLUDED.event_pax,
-                    event_menu_total=EXCLUDED.event_menu_total,
-                    event_timeframe=EXCLUDED.event_timeframe,
-                    venue_fee=EXCLUDED.venue_fee;
-                """,
-                (
-                    day_, total_sales, visa, cash, tips,
-                    lunch_sales, lunch_pax, lunch_walkins, lunch_noshows,
-                    dinner_sales, dinner_pax, dinner_walkins, dinner_noshows,
-                    z_total_sales, transferencia, event_pax,
-                    event_menu_total, event_timeframe, venue_fee, event_in_cm,
-                ),
-            )
+        conn.execute(
+            _SQL_UPSERT_FULL_DAY,
+            (
+                day_, total_sales, visa, cash, tips,
+                lunch_sales, lunch_pax, lunch_walkins, lunch_noshows,
+                dinner_sales, dinner_pax, dinner_walkins, dinner_noshows,
+                z_total_sales, transferencia, event_pax,
+                event_menu_total, event_timeframe, venue_fee, event_in_cm,
+            ),
+            prepare=True,
+        )
         conn.commit()
+    invalidate_daily_aggregates(day_)
 
 
 # TimeFrame sets mirror agora_integration.py _LUNCH_FRAMES / _DINNER_FRAMES
@@ -771,6 +1179,18 @@ _LUNCH_FRAMES_BOT  = {"mediodía", "mediodia", "tarde", "almuerzo", "comida", "d
 _DINNER_FRAMES_BOT = {"noche", "cena"}
 
 
+def save_full_report(d: dict):
+    """Store a parsed full report: the full_daily_stats row plus the
+    matching daily_stats totals."""
+    covers = int(d["lunch_pax"] + d["dinner_pax"])
+    upsert_full_day(
+        d["day"],
+        d["total_sales"], d["visa"], d["cash"], d["tips"],
+        d["lunch_sales"], d["lunch_pax"], d["lunch_walkins"], d["lunch_noshows"],
+        d["dinner_sales"], d["dinner_pax"], d["dinner_walkins"], d["dinner_noshows"],
+    )
+    upsert_daily(d["day"], float(d["total_sales"]), covers)
+
 def upsert_product_sales(day_: date, line_items: list):
     """Aggregate line items by (product, timeframe) and upsert into daily_product_sales."""
     from collections import defaultdict
@@ -887,53 +1307,156 @@ def upsert_server_sales(day_: date, line_items: list, tips_by_user: dict | None
         conn.commit()
 
 
+# Every column is COALESCEd, so callers of get_full_day() get plain
+# floats/ints/str/bool and never need `float(x or 0)`.
+_FULL_DAY_COALESCED_COLUMNS = """
+    COALESCE(total_sales, 0), COALESCE(visa, 0), COALESCE(cash, 0), COALESCE(tips, 0),
+    COALESCE(lunch_sales, 0), COALESCE(lunch_pax, 0),
+    COALESCE(lunch_walkins, 0), COALESCE(lunch_noshows, 0),
+    COALESCE(dinner_sales, 0), COALESCE(dinner_pax, 0),
+    COALESCE(dinner_walkins, 0), COALESCE(dinner_noshows, 0),
+    COALESCE(z_total_sales, 0),
+    COALESCE(transferencia, 0),
+    COALESCE(event_pax, 0),
+    COALESCE(event_menu_total, 0),
+    COALESCE(event_timeframe, ''),
+    COALESCE(venue_fee, 0),
+    COALESCE(event_in_cm, TRUE)
+"""
+
 def get_full_day(day_: date):
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT total_sales, visa, cash, tips,
-                       lunch_sales, lunch_pax, lunch_walkins, lunch_noshows,
-                       dinner_sales, dinner_pax, dinner_walkins, dinner_noshows,
-                       COALESCE(z_total_sales, 0),
-                       COALESCE(transferencia, 0),
-                       COALESCE(event_pax, 0),
-                       COALESCE(event_menu_total, 0),
-                       COALESCE(event_timeframe, ''),
-                       COALESCE(venue_fee, 0),
-                       COALESCE(event_in_cm, TRUE)
-                FROM full_daily_stats
-                WHERE day=%s;
-                """,
-                (day_,),
-            )
-            row = cur.fetchone()
+        row = conn.execute(
+            f"SELECT {_FULL_DAY_COALESCED_COLUMNS} FROM full_daily_stats WHERE day=%s;",
+            (day_,),
+            prepare=True,
+        ).fetchone()
     return row
 
-def sum_full_in_period(p: Period):
+def get_full_day_and_notes(day_: date) -> tuple[tuple | None, list[str]]:
+    """get_full_day(day_) and notes_for_day(day_) in one round-trip."""
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                    COUNT(*) AS full_days,
-                    COALESCE(SUM(total_sales),0),
-                    COALESCE(SUM(tips),0),
-                    COALESCE(SUM(lunch_sales),0),
-                    COALESCE(SUM(lunch_pax),0),
-                    COALESCE(SUM(lunch_walkins),0),
-                    COALESCE(SUM(lunch_noshows),0),
-                    COALESCE(SUM(dinner_sales),0),
-                    COALESCE(SUM(dinner_pax),0),
-                    COALESCE(SUM(dinner_walkins),0),
-                    COALESCE(SUM(dinner_noshows),0),
-                    COALESCE(SUM(z_total_sales),0)
+        row = conn.execute(
+            f"""
+            SELECT f.*, n.texts
+            FROM (SELECT %s::date AS day) d
+            LEFT JOIN LATERAL (
+                SELECT TRUE AS found, {_FULL_DAY_COALESCED_COLUMNS}
                 FROM full_daily_stats
-                WHERE day BETWEEN %s AND %s;
-                """,
-                (p.start, p.end),
-            )
-            row = cur.fetchone()
+                WHERE day = d.day
+            ) f ON TRUE
+            CROSS JOIN LATERAL (
+                SELECT COALESCE(array_agg(text ORDER BY created_at ASC), '{{}}') AS texts
+                FROM notes_entries
+                WHERE day = d.day
+            ) n;
+            """,
+            (day_,),
+            prepare=True,
+        ).fetchone()
+    return (tuple(row[1:-1]) if row[0] else None), list(row[-1])
+
+# Aggregate half of sum_full_in_period(), shared with sum_period_all() and
+# sum_full_in_periods(); {start}/{end} are filled with the bounds to compare.
+_SUM_FULL_SELECT = """
+    SELECT
+        COUNT(*) AS full_days,
+        COALESCE(SUM(total_sales),0),
+        COALESCE(SUM(tips),0),
+        COALESCE(SUM(lunch_sales),0),
+        COALESCE(SUM(lunch_pax),0),
+        COALESCE(SUM(lunch_walkins),0),
+        COALESCE(SUM(lunch_noshows),0),
+        COALESCE(SUM(dinner_sales),0),
+        COALESCE(SUM(dinner_pax),0),
+        COALESCE(SUM(dinner_walkins),0),
+        COALESCE(SUM(dinner_noshows),0),
+        COALESCE(SUM(z_total_sales),0)
+    FROM full_daily_stats
+    WHERE day BETWEEN {start} AND {end}
+"""
+_SUM_FULL_SQL = _SUM_FULL_SELECT.format(start="%(start)s", end="%(end)s")
+_SUM_FULL_MANY_SQL = f"""
+    SELECT f.*
+    FROM unnest(%s::date[], %s::date[]) WITH ORDINALITY AS p(start_day, end_day, i)
+    CROSS JOIN LATERAL ({_SUM_FULL_SELECT.format(start="p.start_day", end="p.end_day")}) f
+    ORDER BY p.i;
+"""
+
+def full_days_exist_in_period(p: Period) -> bool:
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM full_daily_stats WHERE day BETWEEN %s AND %s);",
+            (p.start, p.end),
+            prepare=True,
+        ).fetchone()
+    return bool(row[0])
+
+def sum_full_in_period(p: Period):
+    hit = _agg_cache_get(("full", p.start, p.end))
+    if hit is not None:
+        return dict(hit[1])
+    gen = _agg_cache_gen()
+    with get_conn() as conn:
+        row = conn.execute(_SUM_FULL_SQL, {"start": p.start, "end": p.end}, prepare=True).fetchone()
+    return dict(_agg_cache_put(("full", p.start, p.end), p, _full_sums_to_dict(row), gen))
+
+def sum_full_in_periods(periods: list[Period]) -> list[dict]:
+    """sum_full_in_period() for several periods in one round-trip.
+
+    Cached periods are served from _DAILY_AGG_CACHE; the rest are summed by a
+    single LATERAL query and cached individually.
+    """
+    out = []
+    missing = []
+    gen = _agg_cache_gen()
+    for i, p in enumerate(periods):
+        hit = _agg_cache_get(("full", p.start, p.end))
+        out.append(None if hit is None else dict(hit[1]))
+        if hit is None:
+            missing.append(i)
+    if missing:
+        with get_conn() as conn:
+            rows = conn.execute(
+                _SUM_FULL_MANY_SQL,
+                ([periods[i].start for i in missing], [periods[i].end for i in missing]),
+                prepare=True,
+            ).fetchall()
+        for i, row in zip(missing, rows):
+            p = periods[i]
+            out[i] = dict(_agg_cache_put(("full", p.start, p.end), p, _full_sums_to_dict(row), gen))
+    return out
+
+def sum_period_all(p: Period) -> tuple[tuple[float, int, int], dict]:
+    """sum_daily(p) and sum_full_in_period(p) in one round-trip.
+
+    Both aggregates are computed by a single SELECT over the two tables; the
+    results go into the same cache as the two single-table helpers. If
+    either half is already cached, only the missing one is queried.
+    """
+    daily_hit = _agg_cache_get(("daily", p.start, p.end))
+    full_hit = _agg_cache_get(("full", p.start, p.end))
+    if daily_hit is not None or full_hit is not None:
+        return sum_daily(p), sum_full_in_period(p)
+    gen = _agg_cache_gen()
+    with get_conn() as conn:
+        row = conn.execute(
+            f"""
+            SELECT d.*, f.*
+            FROM (
+                SELECT COALESCE(SUM(sales),0), COALESCE(SUM(covers),0), COUNT(*)
+                FROM daily_stats
+                WHERE day BETWEEN %(start)s AND %(end)s
+            ) d
+            CROSS JOIN ({_SUM_FULL_SQL}) f;
+            """,
+            {"start": p.start, "end": p.end},
+            prepare=True,
+        ).fetchone()
+    full = _agg_cache_put(("full", p.start, p.end), p, _full_sums_to_dict(row[3:]), gen)
+    return _cache_daily_sums(p, row[:3], gen), dict(full)
+
+def _full_sums_to_dict(row) -> dict:
     (
         full_days,
         total_sales, tips,
@@ -960,19 +1483,53 @@ def sum_full_in_period(p: Period):
 # NEW ANALYTICS DB HELPERS
 # =========================
 
+_FULL_DAY_ROW_COLUMNS = """
+    day, total_sales,
+    lunch_sales, lunch_pax, lunch_noshows,
+    dinner_sales, dinner_pax, dinner_noshows,
+    tips,
+    COALESCE(z_total_sales, 0),
+    COALESCE(event_menu_total, 0),
+    COALESCE(event_pax, 0),
+    COALESCE(event_in_cm, TRUE)
+"""
+
+def _full_day_row_to_dict(r) -> dict:
+    sales = float(r[1] or 0)
+    z_sales = float(r[9] or 0) or sales
+    lp = int(r[3] or 0)
+    dp = int(r[6] or 0)
+    ep = int(r[11] or 0)
+    in_cm = bool(r[12]) if r[12] is not None else True
+    covers = lp + dp + (0 if in_cm else ep)
+    lunch_sales = float(r[2] or 0)
+    dinner_sales = float(r[5] or 0)
+    return {
+        "day": r[0],
+        "total_sales": sales,
+        "z_total_sales": z_sales,
+        "event_menu_total": float(r[10] or 0),
+        "event_pax": ep,
+        "event_in_cm": in_cm,
+        "lunch_sales": lunch_sales,
+        "lunch_pax": lp,
+        "lunch_noshows": int(r[4] or 0),
+        "dinner_sales": dinner_sales,
+        "dinner_pax": dp,
+        "dinner_noshows": int(r[7] or 0),
+        "tips": float(r[8] or 0),
+        "covers": covers,
+        "avg_ticket": (z_sales / covers) if covers else 0.0,
+        "lunch_avg": (lunch_sales / lp) if lp else 0.0,
+        "dinner_avg": (dinner_sales / dp) if dp else 0.0,
+    }
+
 def get_full_days_for_weekday(weekday: int, before_or_on: date, limit: int) -> list[dict]:
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                """
-                SELECT day, total_sales,
-                       lunch_sales, lunch_pax, lunch_noshows,
-                       dinner_sales, dinner_pax, dinner_noshows,
-                       tips,
-                       COALESCE(z_total_sales, 0),
-                       COALESCE(event_menu_total, 0),
-                       COALESCE(event_pax, 0),
-                       COALESCE(event_in_cm, TRUE)
+                f"""
+                SELECT {_FULL_DAY_ROW_COLUMNS}
                 FROM full_daily_stats
                 WHERE EXTRACT(ISODOW FROM day) = %s AND day <= %s
                 ORDER BY day DESC
@@ -981,89 +1538,36 @@ def get_full_days_for_weekday(weekday: int, before_or_on: date, limit: int) -> l
                 (weekday, before_or_on, limit),
             )
             rows = cur.fetchall()
-    result = []
-    for r in rows:
-        sales = float(r[1] or 0)
-        z_sales = float(r[9] or 0) or sales
-        lp = int(r[3] or 0)
-        dp = int(r[6] or 0)
-        ep = int(r[11] or 0)
-        in_cm = bool(r[12]) if r[12] is not None else True
-        covers = lp + dp + (0 if in_cm else ep)
-        lunch_sales = float(r[2] or 0)
-        dinner_sales = float(r[5] or 0)
-        result.append({
-            "day": r[0],
-            "total_sales": sales,
-            "z_total_sales": z_sales,
-            "event_menu_total": float(r[10] or 0),
-            "event_pax": ep,
-            "event_in_cm": in_cm,
-            "lunch_sales": lunch_sales,
-            "lunch_pax": lp,
-            "lunch_noshows": int(r[4] or 0),
-            "dinner_sales": dinner_sales,
-            "dinner_pax": dp,
-            "dinner_noshows": int(r[7] or 0),
-            "tips": float(r[8] or 0),
-            "covers": covers,
-            "avg_ticket": (z_sales / covers) if covers else 0.0,
-            "lunch_avg": (lunch_sales / lp) if lp else 0.0,
-            "dinner_avg": (dinner_sales / dp) if dp else 0.0,
-        })
-    return result
-
-def get_full_days_in_period(p: Period) -> list[dict]:
+    return [_full_day_row_to_dict(r) for r in rows]
+
+def get_full_days_in_periods(periods: list[Period]) -> list[list[dict]]:
+    """Rows for several periods in one round-trip, split back per period (day ASC)."""
+    if not periods:
+        return []
+    where = " OR ".join(["day BETWEEN %s AND %s"] * len(periods))
+    params = [d for p in periods for d in (p.start, p.end)]
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                """
-                SELECT day, total_sales,
-                       lunch_sales, lunch_pax, lunch_noshows,
-                       dinner_sales, dinner_pax, dinner_noshows,
-                       tips,
-                       COALESCE(z_total_sales, 0),
-                       COALESCE(event_menu_total, 0),
-                       COALESCE(event_pax, 0),
-                       COALESCE(event_in_cm, TRUE)
+                f"""
+                SELECT {_FULL_DAY_ROW_COLUMNS}
                 FROM full_daily_stats
-                WHERE day BETWEEN %s AND %s
+                WHERE {where}
                 ORDER BY day ASC;
                 """,
-                (p.start, p.end),
+                params,
             )
             rows = cur.fetchall()
-    result = []
+    out: list[list[dict]] = [[] for _ in periods]
     for r in rows:
-        sales = float(r[1] or 0)
-        z_sales = float(r[9] or 0) or sales
-        lp = int(r[3] or 0)
-        dp = int(r[6] or 0)
-        ep = int(r[11] or 0)
-        in_cm = bool(r[12]) if r[12] is not None else True
-        covers = lp + dp + (0 if in_cm else ep)
-        lunch_sales = float(r[2] or 0)
-        dinner_sales = float(r[5] or 0)
-        result.append({
-            "day": r[0],
-            "total_sales": sales,
-            "z_total_sales": z_sales,
-            "event_menu_total": float(r[10] or 0),
-            "event_pax": ep,
-            "event_in_cm": in_cm,
-            "lunch_sales": lunch_sales,
-            "lunch_pax": lp,
-            "lunch_noshows": int(r[4] or 0),
-            "dinner_sales": dinner_sales,
-            "dinner_pax": dp,
-            "dinner_noshows": int(r[7] or 0),
-            "tips": float(r[8] or 0),
-            "covers": covers,
-            "avg_ticket": (z_sales / covers) if covers else 0.0,
-            "lunch_avg": (lunch_sales / lp) if lp else 0.0,
-            "dinner_avg": (dinner_sales / dp) if dp else 0.0,
-        })
-    return result
+        d = _full_day_row_to_dict(r)
+        for i, p in enumerate(periods):
+            if p.start <= r[0] <= p.end:
+                out[i].append(d)
+    return out
+
+def get_full_days_in_period(p: Period) -> list[dict]:
+    return get_full_days_in_periods([p])[0]
 
 def get_full_days_for_dates(dates: list[date]) -> dict:
     if not dates:
@@ -1071,90 +1575,114 @@ def get_full_days_for_dates(dates: list[date]) -> dict:
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                """
-                SELECT day, total_sales,
-                       lunch_sales, lunch_pax, lunch_noshows,
-                       dinner_sales, dinner_pax, dinner_noshows,
-                       tips,
-                       COALESCE(z_total_sales, 0),
-                       COALESCE(event_menu_total, 0),
-                       COALESCE(event_pax, 0),
-                       COALESCE(event_in_cm, TRUE)
+                f"""
+                SELECT {_FULL_DAY_ROW_COLUMNS}
                 FROM full_daily_stats
                 WHERE day = ANY(%s);
                 """,
                 (dates,),
             )
             rows = cur.fetchall()
-    result = {}
-    for r in rows:
-        sales = float(r[1] or 0)
-        z_sales = float(r[9] or 0) or sales
-        lp = int(r[3] or 0)
-        dp = int(r[6] or 0)
-        ep = int(r[11] or 0)
-        in_cm = bool(r[12]) if r[12] is not None else True
-        covers = lp + dp + (0 if in_cm else ep)
-        lunch_sales = float(r[2] or 0)
-        dinner_sales = float(r[5] or 0)
-        result[r[0]] = {
-            "day": r[0],
-            "total_sales": sales,
-            "z_total_sales": z_sales,
-            "event_menu_total": float(r[10] or 0),
-            "event_pax": ep,
-            "event_in_cm": in_cm,
-            "lunch_sales": lunch_sales,
-            "lunch_pax": lp,
-            "lunch_noshows": int(r[4] or 0),
-            "dinner_sales": dinner_sales,
-            "dinner_pax": dp,
-            "dinner_noshows": int(r[7] or 0),
-            "tips": float(r[8] or 0),
-            "covers": covers,
-            "avg_ticket": (z_sales / covers) if covers else 0.0,
-            "lunch_avg": (lunch_sales / lp) if lp else 0.0,
-            "dinner_avg": (dinner_sales / dp) if dp else 0.0,
-        }
-    return result
-
-def get_all_historical_sales() -> list[float]:
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT total_sales FROM full_daily_stats "
-                "WHERE total_sales IS NOT NULL ORDER BY total_sales ASC;"
-            )
-            rows = cur.fetchall()
-    return [float(r[0]) for r in rows]
-
-def get_all_historical_covers() -> list[int]:
+    return {r[0]: _full_day_row_to_dict(r) for r in rows}
+
+# Value at the boundary of the top N% of all recorded days, picked in
+# Postgres with OFFSET instead of shipping every row to Python. The offset is
+# max(0, int(n * (1 - pct/100))) capped at n - 1 into the ascending order;
+# the fraction is computed in Python and passed as float8 so the product
+# rounds the same way a Python float multiply would.
+_SQL_TOP_PCT_THRESHOLDS = """
+    WITH s AS (
+        SELECT total_sales AS v FROM full_daily_stats WHERE total_sales IS NOT NULL
+    ), c AS (
+        SELECT COALESCE(lunch_pax, 0) + COALESCE(dinner_pax, 0) AS v FROM full_daily_stats
+    ), ns AS (
+        SELECT COUNT(*) AS n FROM s
+    ), nc AS (
+        SELECT COUNT(*) AS n FROM c
+    )
+    SELECT
+        ns.n,
+        (SELECT v FROM s ORDER BY v
+         OFFSET LEAST(GREATEST(0, floor(ns.n * %(sales_frac)s::float8)), GREATEST(ns.n - 1, 0))::bigint
+         LIMIT 1),
+        nc.n,
+        (SELECT v FROM c ORDER BY v
+         OFFSET LEAST(GREATEST(0, floor(nc.n * %(covers_frac)s::float8)), GREATEST(nc.n - 1, 0))::bigint
+         LIMIT 1)
+    FROM ns, nc;
+"""
+
+def historical_top_pct_thresholds(sales_top_pct: float, covers_top_pct: float):
+    """(n_sales, sales_thr, n_covers, covers_thr) over all full reports; thresholds are None when empty."""
     with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT COALESCE(lunch_pax, 0) + COALESCE(dinner_pax, 0)
-                FROM full_daily_stats
-                ORDER BY 1 ASC;
-                """
-            )
-            rows = cur.fetchall()
-    return [int(r[0]) for r in rows]
+        n_s, thr_s, n_c, thr_c = conn.execute(
+            _SQL_TOP_PCT_THRESHOLDS,
+            {
+                "sales_frac": 1.0 - sales_top_pct / 100.0,
+                "covers_frac": 1.0 - covers_top_pct / 100.0,
+            },
+        ).fetchone()
+    return (
+        int(n_s),
+        float(thr_s) if thr_s is not None else None,
+        int(n_c),
+        float(thr_c) if thr_c is not None else None,
+    )
 
 # =========================
 # Owners formatting helpers
 # =========================
 def euro_comma(x: float) -> str:
-    s = f"{float(x):.2f}"
+    # Agora amounts are already floats; DB rows may hand over Decimal or int.
+    s = f"{x:.2f}" if type(x) is float else f"{float(x):.2f}"
     return s.replace(".", ",")
 
 def fmt_day_ddmmyyyy(d: date) -> str:
     return d.strftime("%d/%m/%Y")
 
+# =========================
+# OWNERS BROADCAST
+# =========================
+# Sends in flight per broadcast. The AIORateLimiter still paces them; this
+# only keeps a long owner list from opening one request per chat at once.
+BROADCAST_MAX_CONCURRENCY = 8
+
+async def broadcast_text(bot, chats: list[int], text: str, *, label: str) -> int:
+    """Send `text` to every chat concurrently; returns how many sends succeeded.
+
+    Failures are logged per chat and never abort the other sends.
+    """
+    if not chats:
+        return 0
+    sem = asyncio.Semaphore(BROADCAST_MAX_CONCURRENCY)
+
+    async def _send(chat_id: int):
+        async with sem:
+            return await bot.send_message(chat_id=chat_id, text=text)
+
+    results = await asyncio.gather(
+        *(_send(chat_id) for chat_id in chats),
+        return_exceptions=True,
+    )
+    sent = 0
+    for chat_id, res in zip(chats, results):
+        if isinstance(res, BaseException):
+            print(f"{label} send failed for chat {chat_id}: {res}")
+        else:
+            sent += 1
+    return sent
+
 # =========================
 # STATE MAP HELPERS
 # =========================
-def _map_get(app: Application, key: str) -> dict[str, dict]:
+# A flow the user never finishes (/report, /setfull, guided entry) would
+# otherwise keep its entry for the life of the process. Entries expire after
+# MODE_TTL_SECONDS without a set_mode() and each map holds at most
+# MODE_MAX_ENTRIES, dropping the least recently set session first.
+MODE_TTL_SECONDS = 3600.0
+MODE_MAX_ENTRIES = 10_000
+
+def _map_get(app: Application, key: str) -> dict[tuple[int, int], tuple[float, dict]]:
     m = app.bot_data.get(key)
     if not isinstance(m, dict):
         m = {}
@@ -1162,15 +1690,27 @@ def _map_get(app: Application, key: str) -> dict[str, dict]:
     return m
 
 def set_mode(app: Application, keyname: str, chat_id: int, user_id: int, payload: dict):
-    k = f"{chat_id}:{user_id}"
-    _map_get(app, keyname)[k] = payload
+    k = (chat_id, user_id)
+    m = _map_get(app, keyname)
+    # Re-insert so dict order stays oldest-set first.
+    m.pop(k, None)
+    while len(m) >= MODE_MAX_ENTRIES:
+        m.pop(next(iter(m)))
+    m[k] = (time_mod.monotonic() + MODE_TTL_SECONDS, payload)
 
 def get_mode(app: Application, keyname: str, chat_id: int, user_id: int):
-    k = f"{chat_id}:{user_id}"
-    return _map_get(app, keyname).get(k)
+    k = (chat_id, user_id)
+    m = _map_get(app, keyname)
+    hit = m.get(k)
+    if hit is None:
+        return None
+    if time_mod.monotonic() >= hit[0]:
+        m.pop(k, None)
+        return None
+    return hit[1]
 
 def clear_mode(app: Application, keyname: str, chat_id: int, user_id: int):
-    k = f"{chat_id}:{user_id}"
+    k = (chat_id, user_id)
     _map_get(app, keyname).pop(k, None)
 
 # =========================
@@ -1201,17 +1741,24 @@ def allow_full_cmd(update: Update) -> bool:
 # =========================
 # FULL DAILY PARSING (English + Spanish labels)
 # =========================
+_EU_THOUSANDS_RE = re.compile(r"[\d\.]+,\d+")
+_NON_INT_RE = re.compile(r"[^\d\-]")
+
+_NUM_STRIP = str.maketrans("", "", "€ ")
+_EU_TO_DOT = str.maketrans({".": None, ",": "."})
+
 def _num(s: str) -> float:
-    s = (s or "").strip()
-    s = s.replace("€", "").replace(" ", "")
-    if re.fullmatch(r"[\d\.]+,\d+", s):
-        s = s.replace(".", "")
-    s = s.replace(",", ".")
+    s = (s or "").strip().translate(_NUM_STRIP)
+    if _EU_THOUSANDS_RE.fullmatch(s):
+        # "1.234,50": drop thousands dots and turn the decimal comma into a dot
+        s = s.translate(_EU_TO_DOT)
+    else:
+        s = s.replace(",", ".")
     return float(s)
 
 def _int(s: str) -> int:
     s = (s or "").strip()
-    s = re.sub(r"[^\d\-]", "", s)
+    s = _NON_INT_RE.sub("", s)
     return int(s)
 
 FULL_EXAMPLE = (
@@ -1231,69 +1778,77 @@ FULL_EXAMPLE = (
     "No show: 4\n"
 )
 
+# Label prefixes for parse_full_report_block, lowercased once so each line is
+# matched with a single str.startswith(tuple) call instead of a Python loop.
+_FULL_DAY_PREFIXES = ("day", "día", "dia", "fecha")
+_FULL_TOTAL_PREFIXES = ("total sales day", "total sales", "ventas totales día", "ventas totales", "ventas")
+_FULL_VISA_PREFIXES = ("visa", "tarjeta", "card")
+_FULL_CASH_PREFIXES = ("cash", "efectivo")
+_FULL_TIPS_PREFIXES = ("tips", "propinas")
+_FULL_SECTION_LABELS = ("dinner:", "cena:", "lunch:", "almuerzo:", "comida:")
+_FULL_SKIP_PREFIXES = ("average pax", "avg pax", "avg ticket", "average ticket", "media pax", "ticket medio")
+_FULL_PAX_PREFIXES = ("pax", "personas")
+_FULL_WALKIN_PREFIXES = ("walk in", "walk-in", "walkin", "sin reserva", "sin-reserva")
+_FULL_NOSHOW_PREFIXES = ("no show", "no-show", "noshow", "no se presentó", "no se presento")
+
 def parse_full_report_block(text: str) -> dict:
     t = (text or "").strip()
     if not t:
         raise ValueError("Empty")
 
-    def find_line(prefixes: list[str]) -> str | None:
-        for line in t.splitlines():
-            raw = line.strip()
-            for pfx in prefixes:
-                if raw.lower().startswith(pfx.lower()):
-                    return raw.split(":", 1)[1].strip() if ":" in raw else raw[len(pfx):].strip()
+    lines = [ln.strip() for ln in t.splitlines()]
+    lows = [ln.lower() for ln in lines]
+
+    def find_line(prefixes: tuple[str, ...]) -> str | None:
+        for raw, low in zip(lines, lows):
+            if low.startswith(prefixes):
+                if ":" in raw:
+                    return raw.split(":", 1)[1].strip()
+                pfx = next(p for p in prefixes if low.startswith(p))
+                return raw[len(pfx):].strip()
         return None
 
-    day_str = find_line(["Day", "Día", "Dia", "Fecha"])
+    day_str = find_line(_FULL_DAY_PREFIXES)
     if not day_str:
         raise ValueError("Missing Day")
     day_ = parse_any_date(day_str)
 
-    total_sales = _num(find_line(["Total Sales Day", "Total Sales", "Ventas Totales Día", "Ventas Totales", "Ventas"]) or "")
-    visa = _num(find_line(["Visa", "Tarjeta", "Card"]) or "0")
-    cash = _num(find_line(["Cash", "Efectivo"]) or "0")
-    tips = _num(find_line(["Tips", "Propinas"]) or "0")
+    total_sales = _num(find_line(_FULL_TOTAL_PREFIXES) or "")
+    visa = _num(find_line(_FULL_VISA_PREFIXES) or "0")
+    cash = _num(find_line(_FULL_CASH_PREFIXES) or "0")
+    tips = _num(find_line(_FULL_TIPS_PREFIXES) or "0")
 
     def parse_section(section_names: list[str]) -> tuple[float, int, int, int]:
-        lines = [ln.strip() for ln in t.splitlines()]
-        idx = None
-        matched_name = None
-        for i, ln in enumerate(lines):
-            low = ln.lower()
-            for nm in section_names:
-                if low.startswith(nm.lower() + ":"):
-                    idx = i
-                    matched_name = nm
-                    break
-            if idx is not None:
-                break
+        labels = tuple(nm.lower() + ":" for nm in section_names)
+        idx = next((i for i, low in enumerate(lows) if low.startswith(labels)), None)
         if idx is None:
             raise ValueError(f"Missing section {section_names[0]}")
+        matched_name = next(nm for nm, lbl in zip(section_names, labels) if lows[idx].startswith(lbl))
 
         sales_val = _num(lines[idx].split(":", 1)[1].strip())
 
         pax = walkins = noshows = None
         for j in range(idx + 1, min(idx + 12, len(lines))):
-            ln = lines[j].strip()
+            ln = lines[j]
             if not ln:
                 continue
-            low = ln.lower()
+            low = lows[j]
 
-            if any(low.startswith(x.lower() + ":") for x in ["dinner", "cena", "lunch", "almuerzo", "comida"]):
+            if low.startswith(_FULL_SECTION_LABELS):
                 break
 
-            if low.startswith("average pax") or low.startswith("avg pax") or low.startswith("avg ticket") or low.startswith("average ticket") or low.startswith("media pax") or low.startswith("ticket medio"):
+            if low.startswith(_FULL_SKIP_PREFIXES):
                 continue
 
-            if low.startswith("pax") or low.startswith("personas"):
+            if low.startswith(_FULL_PAX_PREFIXES):
                 pax = _int(ln.split(":", 1)[1])
-            elif low.startswith("walk in") or low.startswith("walk-in") or low.startswith("walkin") or low.startswith("sin reserva") or low.startswith("sin-reserva"):
+            elif low.startswith(_FULL_WALKIN_PREFIXES):
                 walkins = _int(ln.split(":", 1)[1])
-            elif low.startswith("no show") or low.startswith("no-show") or low.startswith("noshow") or low.startswith("no se presentó") or low.startswith("no se presento"):
+            elif low.startswith(_FULL_NOSHOW_PREFIXES):
                 noshows = _int(ln.split(":", 1)[1])
 
         if pax is None or walkins is None or noshows is None:
-            raise ValueError(f"Incomplete section {matched_name or section_names[0]} (need Pax/Personas, Walk-in/Sin reserva, No-show/No se presentó)")
+            raise ValueError(f"Incomplete section {matched_name} (need Pax/Personas, Walk-in/Sin reserva, No-show/No se presentó)")
         return float(sales_val), int(pax), int(walkins), int(noshows)
 
     lunch_sales, lunch_pax, lunch_walkins, lunch_noshows = parse_section(["Lunch", "Almuerzo", "Comida"])
@@ -1650,47 +2205,43 @@ def _agent_row_to_dict(row, day_: date, label: str = "") -> dict:
      dinner_sales, dinner_pax, dinner_walkins, dinner_noshows,
      z_total_sales, transferencia, event_pax, event_menu_total,
      event_timeframe, venue_fee, event_in_cm) = row
-    lp = int(lunch_pax or 0)
-    dp = int(dinner_pax or 0)
-    ep = int(event_pax or 0)
-    in_cm = bool(event_in_cm) if event_in_cm is not None else True
-    covers = lp + dp + (0 if in_cm else ep)
-    z_sales = float(z_total_sales or 0) or float(total_sales or 0)
+    covers = lunch_pax + dinner_pax + (0 if event_in_cm else event_pax)
+    z_sales = z_total_sales or total_sales
     rls, rlc, rds, rdc = _regular_shift_metrics(
-        lunch_sales, lp, dinner_sales, dp,
-        ep, event_menu_total, event_timeframe, in_cm,
+        lunch_sales, lunch_pax, dinner_sales, dinner_pax,
+        event_pax, event_menu_total, event_timeframe, event_in_cm,
     )
     reg_covers = rlc + rdc
     return {
         "date": day_.isoformat(),
         **({"label": label} if label else {}),
-        "total_sales": float(total_sales or 0),
+        "total_sales": total_sales,
         "z_total_sales": z_sales,
-        "visa": float(visa or 0),
-        "cash": float(cash or 0),
-        "transferencia": float(transferencia or 0),
-        "tips": float(tips or 0),
+        "visa": visa,
+        "cash": cash,
+        "transferencia": transferencia,
+        "tips": tips,
         "covers": covers,
         "avg_ticket": (rls + rds) / reg_covers if reg_covers else 0.0,
-        "lunch_sales": float(lunch_sales or 0),
-        "lunch_pax": lp,
-        "lunch_walkins": int(lunch_walkins or 0),
-        "lunch_noshows": int(lunch_noshows or 0),
+        "lunch_sales": lunch_sales,
+        "lunch_pax": lunch_pax,
+        "lunch_walkins": lunch_walkins,
+        "lunch_noshows": lunch_noshows,
         "lunch_avg": rls / rlc if rlc else 0.0,
-        "dinner_sales": float(dinner_sales or 0),
-        "dinner_pax": dp,
-        "dinner_walkins": int(dinner_walkins or 0),
-        "dinner_noshows": int(dinner_noshows or 0),
+        "dinner_sales": dinner_sales,
+        "dinner_pax": dinner_pax,
+        "dinner_walkins": dinner_walkins,
+        "dinner_noshows": dinner_noshows,
         "dinner_avg": rds / rdc if rdc else 0.0,
         "reg_lunch_sales": rls,
         "reg_lunch_covers": rlc,
         "reg_dinner_sales": rds,
         "reg_dinner_covers": rdc,
-        "event_pax": ep,
-        "event_menu_total": float(event_menu_total or 0),
-        "event_timeframe": event_timeframe or "",
-        "venue_fee": float(venue_fee or 0),
-        "event_in_cm": in_cm,
+        "event_pax": event_pax,
+        "event_menu_total": event_menu_total,
+        "event_timeframe": event_timeframe,
+        "venue_fee": venue_fee,
+        "event_in_cm": event_in_cm,
     }
 
 
@@ -1755,8 +2306,9 @@ def _exec_get_week_comparison() -> dict:
     this_mon = _last_monday(today)
     last_mon = this_mon - timedelta(days=7)
     last_equiv = today - timedelta(days=7)
-    a = _sum_period_rows(get_full_days_in_period(Period(this_mon, today)))
-    b = _sum_period_rows(get_full_days_in_period(Period(last_mon, last_equiv)))
+    rows_this, rows_last = get_full_days_in_periods([Period(this_mon, today), Period(last_mon, last_equiv)])
+    a = _sum_period_rows(rows_this)
+    b = _sum_period_rows(rows_last)
     return {
         "this_week": {"start": this_mon.isoformat(), "end": today.isoformat(), **a},
         "last_week": {"start": last_mon.isoformat(), "end": last_equiv.isoformat(), **b},
@@ -1768,8 +2320,9 @@ def _exec_get_month_comparison() -> dict:
     this_start = date(today.year, today.month, 1)
     last_start = add_months(this_start, -1)
     last_equiv = add_months(today, -1)
-    a = _sum_period_rows(get_full_days_in_period(Period(this_start, today)))
-    b = _sum_period_rows(get_full_days_in_period(Period(last_start, last_equiv)))
+    rows_this, rows_last = get_full_days_in_periods([Period(this_start, today), Period(last_start, last_equiv)])
+    a = _sum_period_rows(rows_this)
+    b = _sum_period_rows(rows_last)
     return {
         "this_month": {"start": this_start.isoformat(), "end": today.isoformat(), **a},
         "last_month": {"start": last_start.isoformat(), "end": last_equiv.isoformat(), **b},
@@ -1783,8 +2336,9 @@ def _exec_get_weekend_comparison() -> dict:
     last_fri = last_sat - timedelta(days=1)
     prev_sat = last_sat - timedelta(days=7)
     prev_fri = prev_sat - timedelta(days=1)
-    a = _sum_period_rows(list(get_full_days_for_dates([last_fri, last_sat]).values()))
-    b = _sum_period_rows(list(get_full_days_for_dates([prev_fri, prev_sat]).values()))
+    rows = get_full_days_for_dates([last_fri, last_sat, prev_fri, prev_sat])
+    a = _sum_period_rows([rows[d] for d in (last_fri, last_sat) if d in rows])
+    b = _sum_period_rows([rows[d] for d in (prev_fri, prev_sat) if d in rows])
     return {
         "last_weekend": {"fri": last_fri.isoformat(), "sat": last_sat.isoformat(), **a},
         "prev_weekend": {"fri": prev_fri.isoformat(), "sat": prev_sat.isoformat(), **b},
@@ -1806,12 +2360,12 @@ def _exec_get_notes(start_date: str, end_date: str) -> dict:
         end = parse_yyyy_mm_dd(end_date)
     except Exception:
         return {"error": "Invalid date format. Use YYYY-MM-DD."}
-    rows = notes_in_period(Period(start, end))
+    total, rows = latest_notes_in_period(Period(start, end), 20)
     entries = [
         {"date": d.isoformat(), "tags": extract_note_tags(txt), "text": txt[:600]}
-        for d, txt in rows[-20:]
+        for d, txt in rows
     ]
-    return {"start_date": start_date, "end_date": end_date, "total_notes": len(rows), "entries": entries}
+    return {"start_date": start_date, "end_date": end_date, "total_notes": total, "entries": entries}
 
 
 def _exec_get_reservations(start_date: str, end_date: str) -> dict:
@@ -1956,8 +2510,7 @@ def _exec_get_booking_sources(start_date: str, end_date: str, group_by: str = "t
             result["note"] = f"Showing partial results{partial_note}"
         return result
     else:
-        from collections import Counter as _Ctr
-        counts = _Ctr(_classify_channel(r) for r in records)
+        counts = Counter(map(_classify_channel, records))
         total  = sum(counts.values())
         result = {
             "start_date": start_date, "end_date": end_date,
@@ -2429,13 +2982,13 @@ async def handle_agent_query(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
             # Execute all tool calls and continue the loop
             messages.append({"role": "assistant", "content": response.content})
+            # Tool calls in one turn are independent; run them side by side.
+            contents = await asyncio.gather(
+                *(asyncio.to_thread(execute_agent_tool, tu.name, tu.input) for tu in tool_uses)
+            )
             tool_results = [
-                {
-                    "type": "tool_result",
-                    "tool_use_id": tu.id,
-                    "content": execute_agent_tool(tu.name, tu.input),
-                }
-                for tu in tool_uses
+                {"type": "tool_result", "tool_use_id": tu.id, "content": content}
+                for tu, content in zip(tool_uses, contents)
             ]
             messages.append({"role": "user", "content": tool_results})
 
@@ -2450,21 +3003,13 @@ async def handle_agent_query(update: Update, context: ContextTypes.DEFAULT_TYPE,
 # ANOMALY ALERT SYSTEM
 # =========================
 
-def _top_pct_threshold(sorted_asc: list[float], top_pct: float) -> float:
-    """Value at the boundary of the top `top_pct`% of a sorted-ascending list."""
-    if not sorted_asc:
-        return float("inf")
-    idx = max(0, int(len(sorted_asc) * (1.0 - top_pct / 100.0)))
-    return sorted_asc[min(idx, len(sorted_asc) - 1)]
-
-
 async def send_evening_alerts(context: ContextTypes.DEFAULT_TYPE):
-    chats = owners_silent_chat_ids()
+    chats = await asyncio.to_thread(owners_silent_chat_ids)
     if not chats:
         return
 
     yesterday = previous_business_day(now_local())
-    row = get_full_day(yesterday)
+    row = await asyncio.to_thread(get_full_day, yesterday)
     if not row:
         return  # No full report posted yet — skip silently
 
@@ -2474,18 +3019,9 @@ async def send_evening_alerts(context: ContextTypes.DEFAULT_TYPE):
      z_total_sales, _transferencia, event_pax, _event_menu_total,
      _event_timeframe, _venue_fee, event_in_cm) = row
 
-    z             = float(z_total_sales or 0)
-    total_sales   = z if z > 0 else float(total_sales or 0)
-    lunch_sales   = float(lunch_sales or 0)
-    dinner_sales  = float(dinner_sales or 0)
-    lunch_pax     = int(lunch_pax or 0)
-    dinner_pax    = int(dinner_pax or 0)
-    ep            = int(event_pax or 0)
-    in_cm         = bool(event_in_cm) if event_in_cm is not None else True
-    lunch_noshows  = int(lunch_noshows or 0)
-    dinner_noshows = int(dinner_noshows or 0)
-    tips           = float(tips or 0)
-    covers         = lunch_pax + dinner_pax + (0 if in_cm else ep)
+    if z_total_sales > 0:
+        total_sales = z_total_sales
+    covers         = lunch_pax + dinner_pax + (0 if event_in_cm else event_pax)
     lunch_avg      = (lunch_sales  / lunch_pax)  if lunch_pax  else 0.0
     dinner_avg     = (dinner_sales / dinner_pax) if dinner_pax else 0.0
     tips_pct       = (tips / total_sales * 100)  if total_sales else 0.0
@@ -2495,7 +3031,7 @@ async def send_evening_alerts(context: ContextTypes.DEFAULT_TYPE):
     day_name  = day_names[weekday - 1]
 
     # Same-weekday history: [yesterday, prev1, prev2, prev3, prev4] ordered DESC
-    same_wd_rows = get_full_days_for_weekday(weekday, yesterday, 5)
+    same_wd_rows = await asyncio.to_thread(get_full_days_for_weekday, weekday, yesterday, 5)
     prev_wd_rows  = same_wd_rows[1:]  # Exclude yesterday; up to 4 previous same-weekday records
 
     def _avg(vals: list) -> float:
@@ -2618,25 +3154,23 @@ async def send_evening_alerts(context: ContextTypes.DEFAULT_TYPE):
 
     # ── POSITIVE ALERTS ✅ ────────────────────────────────────────────────────
 
+    n_sales_hist, rev_thr, n_covers_hist, cov_thr = await asyncio.to_thread(
+        historical_top_pct_thresholds, ALERT_TOP_PERCENTILE, ALERT_POSITIVE_COVERS_PCT
+    )
+
     # 8. Revenue in top ALERT_TOP_PERCENTILE % of all recorded days
-    all_sales_hist = get_all_historical_sales()
-    if len(all_sales_hist) >= 10:
-        rev_thr = _top_pct_threshold(all_sales_hist, ALERT_TOP_PERCENTILE)
-        if total_sales >= rev_thr:
-            alerts.append(
-                f"✅ Revenue €{total_sales:.0f} is in the top {ALERT_TOP_PERCENTILE:.0f}% of all recorded days "
-                f"(threshold ≥ €{rev_thr:.0f})"
-            )
+    if n_sales_hist >= 10 and total_sales >= rev_thr:
+        alerts.append(
+            f"✅ Revenue €{total_sales:.0f} is in the top {ALERT_TOP_PERCENTILE:.0f}% of all recorded days "
+            f"(threshold ≥ €{rev_thr:.0f})"
+        )
 
     # 9. Covers in top ALERT_POSITIVE_COVERS_PCT % of all recorded days
-    all_covers_hist = get_all_historical_covers()
-    if len(all_covers_hist) >= 10:
-        cov_thr = _top_pct_threshold([float(c) for c in all_covers_hist], ALERT_POSITIVE_COVERS_PCT)
-        if covers >= cov_thr:
-            alerts.append(
-                f"✅ Covers {covers} are in the top {ALERT_POSITIVE_COVERS_PCT:.0f}% of all recorded days "
-                f"(threshold ≥ {int(cov_thr)})"
-            )
+    if n_covers_hist >= 10 and covers >= cov_thr:
+        alerts.append(
+            f"✅ Covers {covers} are in the top {ALERT_POSITIVE_COVERS_PCT:.0f}% of all recorded days "
+            f"(threshold ≥ {int(cov_thr)})"
+        )
 
     # 10. Dinner turnaround: yesterday bounced ≥ threshold % above prev-3 same-weekday dinner avg
     if len(same_wd_rows) >= 4:
@@ -2657,11 +3191,7 @@ async def send_evening_alerts(context: ContextTypes.DEFAULT_TYPE):
         return
 
     msg = f"🔔 Norah Evening Alerts — {fmt_day_ddmmyyyy(yesterday)}\n\n" + "\n\n".join(alerts)
-    for chat_id in chats:
-        try:
-            await context.bot.send_message(chat_id=chat_id, text=msg)
-        except Exception as e:
-            print(f"Evening alert send failed for chat {chat_id}: {e}")
+    await broadcast_text(context.bot, chats, msg, label="Evening alert")
 
 
 # =========================
@@ -2706,8 +3236,10 @@ HELP_TEXT = (
     "/whoami\n"
 )
 
+START_TEXT = "👋 Norah Ops is online.\n\n" + HELP_TEXT
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("👋 Norah Ops is online.\n\n" + HELP_TEXT)
+    await update.message.reply_text(START_TEXT)
 
 async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(HELP_TEXT)
@@ -2795,6 +3327,14 @@ async def whoami(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"🔐 Admin: {'YES' if is_admin(update) else 'NO'}"
     )
 
+# /ping must answer even when the DB is down or the pool is saturated, so
+# its check waits at most PING_DB_TIMEOUT_SECONDS instead of DB_POOL_TIMEOUT.
+PING_DB_TIMEOUT_SECONDS = 2.0
+
+def _db_ping():
+    with _get_pool().connection(timeout=PING_DB_TIMEOUT_SECONDS) as conn:
+        conn.execute("SELECT 1;").fetchone()
+
 async def ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     user = update.effective_user
@@ -2803,20 +3343,30 @@ async def ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     db_ok = False
     db_err = ""
+    owners = []
     try:
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT 1;")
-                cur.fetchone()
-        db_ok = True
-    except Exception as e:
+        # The owners lookup overlaps the DB check instead of following it.
+        ping_res, owners_res = await asyncio.wait_for(
+            asyncio.gather(
+                asyncio.to_thread(_db_ping),
+                asyncio.to_thread(owners_silent_chat_ids),
+                return_exceptions=True,
+            ),
+            timeout=PING_DB_TIMEOUT_SECONDS + 1,
+        )
+        if isinstance(ping_res, Exception):
+            db_err = str(ping_res)[:180]
+        else:
+            db_ok = True
+            if not isinstance(owners_res, Exception):
+                owners = owners_res
+    except asyncio.TimeoutError:
         db_ok = False
-        db_err = str(e)[:180]
+        db_err = f"no answer within {PING_DB_TIMEOUT_SECONDS:g}s"
 
     now = now_local()
     bday = business_day_today()
     prev_bday = previous_business_day(now)
-    owners = owners_silent_chat_ids()
 
     allow_mode = "OPEN" if ACCESS_MODE == "OPEN" else ("OPEN (no ALLOWED_USER_IDS set)" if not ALLOWED_USER_IDS else "RESTRICTED")
     jobq = "YES" if context.application.job_queue is not None else "NO"
@@ -2830,6 +3380,12 @@ async def ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     if not db_ok:
         msg += f"DB error: {db_err}\n"
+    if _POOL is not None:
+        st = _POOL.get_stats()
+        msg += (
+            f"DB pool: {st.get('pool_size', 0)}/{st.get('pool_max', DB_POOL_MAX_SIZE)} open, "
+            f"{st.get('pool_available', 0)} idle, {st.get('requests_waiting', 0)} waiting\n"
+        )
 
     msg += (
         f"\nTime: {now.strftime('%Y-%m-%d %H:%M')} ({TZ_NAME})\n"
@@ -2860,6 +3416,7 @@ async def resetdb_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
             cur.execute("TRUNCATE TABLE daily_stats;")
             cur.execute("TRUNCATE TABLE notes_entries;")
         conn.commit()
+    invalidate_daily_aggregates()
     await update.message.reply_text("✅ Database wiped. All sales and notes data deleted. Ready for real data.")
 
 async def deleteday_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -2882,6 +3439,7 @@ async def deleteday_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
             cur.execute("DELETE FROM notes_entries WHERE day = %s;", (day_,))
             deleted_notes = cur.rowcount
         conn.commit()
+    invalidate_daily_aggregates(day_)
     await update.message.reply_text(
         f"🗑️ Deleted data for {day_.isoformat()}:\n"
         f"  Full stats: {deleted_full} row(s)\n"
@@ -2890,38 +3448,82 @@ async def deleteday_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
-def _append_full_analytics_block(p: Period) -> str:
-    agg = sum_full_in_period(p)
+_FULL_ANALYTICS_TEMPLATE = (
+    "\n\n🍽️ Service split (weighted)\n"
+    "Lunch avg ticket: €{lunch_avg:.2f}\n"
+    "Dinner avg ticket: €{dinner_avg:.2f}\n"
+    "\n💶 Tips\n"
+    "Total tips: €{tips:.2f}\n"
+    "Avg tips/day: €{avg_tips_day:.2f}\n"
+    "Tip/cover: €{tip_per_cover:.2f}\n"
+    "Tips % of sales: {tips_pct:.1f}%\n"
+    "\n🚶 Walk-ins\n"
+    "Total walk-ins: {walkins_total}\n"
+    "Avg walk-ins/day: {avg_walkins_day:.2f}\n"
+    "Walk-ins rate: {walkins_rate:.1f}%"
+)
+
+_DAILY_REPORT_TEMPLATE = (
+    "📊 Norah Daily Report\n\n"
+    "Business day: {day}\n"
+    "Sales: €{sales:.2f}\n"
+    "Covers: {covers}\n"
+    "Avg ticket: €{avg:.2f}"
+)
+
+_PERIOD_REPORT_TEMPLATE = (
+    "{title}\n"
+    "Period: {start} → {end} ({n_days} day(s))\n\n"
+    "Days with data: {days_with_data}\n"
+    "Total sales: €{total_sales:.2f}\n"
+    "Total covers: {total_covers}\n"
+    "Avg ticket: €{avg_ticket:.2f}"
+)
+
+def _daily_report_from_row(day_: date, sales, covers) -> str:
+    """Render the /daily header from an already-fetched daily_stats row."""
+    sales = float(sales or 0)
+    covers = int(covers or 0)
+    return _DAILY_REPORT_TEMPLATE.format_map({
+        "day": day_.isoformat(),
+        "sales": sales,
+        "covers": covers,
+        "avg": (sales / covers) if covers else 0.0,
+    })
+
+def _full_analytics_block(agg: dict) -> str:
     full_days = agg["full_days"]
     if full_days <= 0:
         return ""
 
-    lunch_avg = (agg["lunch_sales"] / agg["lunch_pax"]) if agg["lunch_pax"] else 0.0
-    dinner_avg = (agg["dinner_sales"] / agg["dinner_pax"]) if agg["dinner_pax"] else 0.0
-
     covers_full = agg["lunch_pax"] + agg["dinner_pax"]
-    tips_pct = (agg["tips"] / agg["total_sales"] * 100.0) if agg["total_sales"] else 0.0
-    tip_per_cover = (agg["tips"] / covers_full) if covers_full else 0.0
-    avg_tips_day = (agg["tips"] / full_days) if full_days else 0.0
-
     walkins_total = agg["lunch_walkins"] + agg["dinner_walkins"]
-    walkins_rate = (walkins_total / covers_full * 100.0) if covers_full else 0.0
-    avg_walkins_day = (walkins_total / full_days) if full_days else 0.0
+    return _FULL_ANALYTICS_TEMPLATE.format_map({
+        "lunch_avg": (agg["lunch_sales"] / agg["lunch_pax"]) if agg["lunch_pax"] else 0.0,
+        "dinner_avg": (agg["dinner_sales"] / agg["dinner_pax"]) if agg["dinner_pax"] else 0.0,
+        "tips": agg["tips"],
+        "avg_tips_day": agg["tips"] / full_days,
+        "tip_per_cover": (agg["tips"] / covers_full) if covers_full else 0.0,
+        "tips_pct": (agg["tips"] / agg["total_sales"] * 100.0) if agg["total_sales"] else 0.0,
+        "walkins_total": walkins_total,
+        "avg_walkins_day": walkins_total / full_days,
+        "walkins_rate": (walkins_total / covers_full * 100.0) if covers_full else 0.0,
+    })
 
-    return (
-        "\n\n🍽️ Service split (weighted)\n"
-        f"Lunch avg ticket: €{lunch_avg:.2f}\n"
-        f"Dinner avg ticket: €{dinner_avg:.2f}\n"
-        "\n💶 Tips\n"
-        f"Total tips: €{agg['tips']:.2f}\n"
-        f"Avg tips/day: €{avg_tips_day:.2f}\n"
-        f"Tip/cover: €{tip_per_cover:.2f}\n"
-        f"Tips % of sales: {tips_pct:.1f}%\n"
-        "\n🚶 Walk-ins\n"
-        f"Total walk-ins: {walkins_total}\n"
-        f"Avg walk-ins/day: {avg_walkins_day:.2f}\n"
-        f"Walk-ins rate: {walkins_rate:.1f}%"
-    )
+def _period_report_text(title: str, p: Period) -> str:
+    """Shared body of /month, /last and /range."""
+    (total_sales, total_covers, days_with_data), full_agg = sum_period_all(p)
+    msg = _PERIOD_REPORT_TEMPLATE.format_map({
+        "title": title,
+        "start": p.start.isoformat(),
+        "end": p.end.isoformat(),
+        "n_days": daterange_days(p),
+        "days_with_data": days_with_data,
+        "total_sales": total_sales,
+        "total_covers": total_covers,
+        "avg_ticket": (total_sales / total_covers) if total_covers else 0.0,
+    })
+    return msg + _full_analytics_block(full_agg)
 
 async def setdaily(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
@@ -2936,8 +3538,8 @@ async def setdaily(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Usage: /setdaily SALES COVERS\nExample: /setdaily 2450 118")
         return
     day_ = business_day_today()
-    upsert_daily(day_, sales, covers)
-    await update.message.reply_text(f"Saved ✅  Day: {day_.isoformat()} | Sales: €{sales:.2f} | Covers: {covers}")
+    sales, covers = await asyncio.to_thread(upsert_daily, day_, sales, covers)
+    await update.message.reply_text(f"Saved ✅  Day: {day_.isoformat()} | Sales: €{float(sales):.2f} | Covers: {covers}")
 
 async def edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
@@ -2952,30 +3554,20 @@ async def edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except:
         await update.message.reply_text("Usage: /edit YYYY-MM-DD SALES COVERS")
         return
-    upsert_daily(day_, sales, covers)
-    await update.message.reply_text(f"Edited ✅  Day: {day_.isoformat()} | Sales: €{sales:.2f} | Covers: {covers}")
+    sales, covers = await asyncio.to_thread(upsert_daily, day_, sales, covers)
+    await update.message.reply_text(f"Edited ✅  Day: {day_.isoformat()} | Sales: €{float(sales):.2f} | Covers: {covers}")
 
 async def daily(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
         return
     day_ = business_day_today()
-    row = get_daily(day_)
-    if not row:
+    # One-day period: the sums are the day's own row, fetched together with
+    # the full_daily_stats block in a single round-trip.
+    (sales, covers, days_with_data), full_agg = await asyncio.to_thread(sum_period_all, Period(day_, day_))
+    if not days_with_data:
         await update.message.reply_text(f"No data for business day {day_.isoformat()} yet. Use: /setdaily 2450 118")
         return
-    sales, covers = row
-    sales = float(sales or 0)
-    covers = int(covers or 0)
-    avg = (sales / covers) if covers else 0.0
-    p = Period(day_, day_)
-    msg = (
-        f"📊 Norah Daily Report\n\n"
-        f"Business day: {day_.isoformat()}\n"
-        f"Sales: €{sales:.2f}\n"
-        f"Covers: {covers}\n"
-        f"Avg ticket: €{avg:.2f}"
-    )
-    msg += _append_full_analytics_block(p)
+    msg = _daily_report_from_row(day_, sales, covers) + _full_analytics_block(full_agg)
     await update.message.reply_text(msg)
 
 async def month(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -2984,18 +3576,7 @@ async def month(update: Update, context: ContextTypes.DEFAULT_TYPE):
     end = business_day_today()
     start = date(end.year, end.month, 1)
     p = Period(start=start, end=end)
-    total_sales, total_covers, days_with_data = sum_daily(p)
-    avg_ticket = (total_sales / total_covers) if total_covers else 0.0
-    msg = (
-        f"📈 Norah Month-to-Date\n"
-        f"Period: {p.start.isoformat()} → {p.end.isoformat()} ({daterange_days(p)} day(s))\n\n"
-        f"Days with data: {days_with_data}\n"
-        f"Total sales: €{total_sales:.2f}\n"
-        f"Total covers: {total_covers}\n"
-        f"Avg ticket: €{avg_ticket:.2f}"
-    )
-    msg += _append_full_analytics_block(p)
-    await update.message.reply_text(msg)
+    await update.message.reply_text(await asyncio.to_thread(_period_report_text, "📈 Norah Month-to-Date", p))
 
 async def last(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
@@ -3008,18 +3589,7 @@ async def last(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except:
         await update.message.reply_text("Usage: /last 7   OR   /last 6M   OR   /last 1Y")
         return
-    total_sales, total_covers, days_with_data = sum_daily(p)
-    avg_ticket = (total_sales / total_covers) if total_covers else 0.0
-    msg = (
-        f"📊 Norah Summary\n"
-        f"Period: {p.start.isoformat()} → {p.end.isoformat()} ({daterange_days(p)} day(s))\n\n"
-        f"Days with data: {days_with_data}\n"
-        f"Total sales: €{total_sales:.2f}\n"
-        f"Total covers: {total_covers}\n"
-        f"Avg ticket: €{avg_ticket:.2f}"
-    )
-    msg += _append_full_analytics_block(p)
-    await update.message.reply_text(msg)
+    await update.message.reply_text(await asyncio.to_thread(_period_report_text, "📊 Norah Summary", p))
 
 async def range_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
@@ -3036,26 +3606,17 @@ async def range_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Usage: /range YYYY-MM-DD YYYY-MM-DD")
         return
     p = Period(start=start, end=end)
-    total_sales, total_covers, days_with_data = sum_daily(p)
-    avg_ticket = (total_sales / total_covers) if total_covers else 0.0
-    msg = (
-        f"📊 Norah Range Report\n"
-        f"Period: {p.start.isoformat()} → {p.end.isoformat()} ({daterange_days(p)} day(s))\n\n"
-        f"Days with data: {days_with_data}\n"
-        f"Total sales: €{total_sales:.2f}\n"
-        f"Total covers: {total_covers}\n"
-        f"Avg ticket: €{avg_ticket:.2f}"
-    )
-    msg += _append_full_analytics_block(p)
-    await update.message.reply_text(msg)
+    await update.message.reply_text(await asyncio.to_thread(_period_report_text, "📊 Norah Range Report", p))
+
+NO_SALES_DATA_TEXT = "No sales data found yet."
 
 async def bestday(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
         return
     p = period_ending_today("30")
-    row = best_or_worst_day(p, worst=False)
+    row = await asyncio.to_thread(best_or_worst_day, p, False)
     if not row:
-        await update.message.reply_text("No sales data found yet.")
+        await update.message.reply_text(NO_SALES_DATA_TEXT)
         return
     d, sales, covers = row
     avg = (float(sales) / int(covers)) if covers else 0.0
@@ -3067,9 +3628,9 @@ async def worstday(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
         return
     p = period_ending_today("30")
-    row = best_or_worst_day(p, worst=True)
+    row = await asyncio.to_thread(best_or_worst_day, p, True)
     if not row:
-        await update.message.reply_text("No sales data found yet.")
+        await update.message.reply_text(NO_SALES_DATA_TEXT)
         return
     d, sales, covers = row
     avg = (float(sales) / int(covers)) if covers else 0.0
@@ -3116,7 +3677,7 @@ async def reportdaily(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_notes_cmd(update):
         return
     day_ = business_day_today()
-    texts = notes_for_day(day_)
+    texts = await asyncio.to_thread(notes_for_day, day_)
     if not texts:
         await update.message.reply_text(f"No notes saved for business day {day_.isoformat()} yet.\nUse /report to submit notes.")
         return
@@ -3134,7 +3695,7 @@ async def reportday(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except:
         await update.message.reply_text("Usage: /reportday YYYY-MM-DD")
         return
-    texts = notes_for_day(day_)
+    texts = await asyncio.to_thread(notes_for_day, day_)
     if not texts:
         await update.message.reply_text(f"No notes saved for {day_.isoformat()}.")
         return
@@ -3142,6 +3703,8 @@ async def reportday(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(f"📝 Notes for {day_.isoformat()}:\n\n{joined}")
 
 # Notes analytics
+NO_NOTES_TEXT = "No notes found for that period yet."
+
 async def noteslast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
         return
@@ -3153,14 +3716,10 @@ async def noteslast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except:
         await update.message.reply_text("Usage: /noteslast 30   (or 6M / 1Y)")
         return
-    rows = notes_in_period(p)
-    if not rows:
-        await update.message.reply_text("No notes found for that period yet.")
+    top = await asyncio.to_thread(top_note_words, p)
+    if not top and not await asyncio.to_thread(notes_exist_in_period, p):
+        await update.message.reply_text(NO_NOTES_TEXT)
         return
-    counter = Counter()
-    for _, txt in rows:
-        counter.update(tokenize(txt))
-    top = counter.most_common(12)
     lines = [f"{w}: {c}" for w, c in top] if top else ["(no keywords yet)"]
     await update.message.reply_text("📊 Notes trends:\n" + "\n".join(lines))
 
@@ -3175,19 +3734,10 @@ async def findnote(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Usage: /findnote keyword")
         return
     p = period_ending_today("1Y")
-    rows = notes_in_period(p)
-    matches: list[date] = []
-    for d, txt in rows:
-        if keyword in (txt or "").lower():
-            matches.append(d)
-    if not matches:
+    show = await asyncio.to_thread(find_note_days, p, keyword)
+    if not show:
         await update.message.reply_text(f"No notes found containing: {keyword}")
         return
-    uniq = []
-    for d in matches:
-        if d not in uniq:
-            uniq.append(d)
-    show = uniq[-10:]
     await update.message.reply_text(f"🔎 Matches for '{keyword}':\n" + "\n".join(d.isoformat() for d in show))
 
 async def soldout(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -3201,26 +3751,14 @@ async def soldout(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except:
         await update.message.reply_text("Usage: /soldout 30")
         return
-    rows = notes_in_period(p)
-    if not rows:
-        await update.message.reply_text("No notes found for that period yet.")
+    matched, n_tagged, top = await asyncio.to_thread(tag_keyword_counts, p, "SOLD OUT", SOLD_OUT_KEYWORDS, _SOLD_OUT_RE)
+    if not matched and not await asyncio.to_thread(notes_exist_in_period, p):
+        await update.message.reply_text(NO_NOTES_TEXT)
         return
 
-    tagged_texts = [(d, txt) for d, txt in rows if "SOLD OUT" in extract_note_tags(txt)]
-    if tagged_texts:
-        counter = Counter()
-        for _, txt in tagged_texts:
-            content = extract_tag_content(txt, "SOLD OUT")
-            counter.update(tokenize(content))
-        top = counter.most_common(12)
-        source = f"({len(tagged_texts)} tagged notes)"
+    if n_tagged:
+        source = f"({n_tagged} tagged notes)"
     else:
-        counter = Counter()
-        for _, txt in rows:
-            t = (txt or "").lower()
-            if "sold out" in t or "agotad" in t:
-                counter.update(tokenize(txt))
-        top = counter.most_common(12)
         source = "(keyword fallback — consider using [SOLD OUT] tags)"
 
     if not top:
@@ -3241,26 +3779,14 @@ async def complaints(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except:
         await update.message.reply_text("Usage: /complaints 30")
         return
-    rows = notes_in_period(p)
-    if not rows:
-        await update.message.reply_text("No notes found for that period yet.")
+    matched, n_tagged, top = await asyncio.to_thread(tag_keyword_counts, p, "COMPLAINT", COMPLAINT_KEYWORDS, _COMPLAINT_RE)
+    if not matched and not await asyncio.to_thread(notes_exist_in_period, p):
+        await update.message.reply_text(NO_NOTES_TEXT)
         return
 
-    tagged_texts = [(d, txt) for d, txt in rows if "COMPLAINT" in extract_note_tags(txt)]
-    if tagged_texts:
-        counter = Counter()
-        for _, txt in tagged_texts:
-            content = extract_tag_content(txt, "COMPLAINT")
-            counter.update(tokenize(content))
-        top = counter.most_common(12)
-        source = f"({len(tagged_texts)} tagged notes)"
+    if n_tagged:
+        source = f"({n_tagged} tagged notes)"
     else:
-        counter = Counter()
-        for _, txt in rows:
-            t = (txt or "").lower()
-            if "complaint" in t or "queja" in t:
-                counter.update(tokenize(txt))
-        top = counter.most_common(12)
         source = "(keyword fallback — consider using [COMPLAINT] tags)"
 
     if not top:
@@ -3278,22 +3804,11 @@ async def tagstats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except:
         await update.message.reply_text("Usage: /tagstats  or  /tagstats 60")
         return
-    rows = notes_in_period(p)
-    if not rows:
-        await update.message.reply_text("No notes found for that period yet.")
+    total, counts, untagged = await asyncio.to_thread(note_tag_counts, p)
+    if not total:
+        await update.message.reply_text(NO_NOTES_TEXT)
         return
 
-    counts: dict[str, int] = {tag: 0 for tag in NOTE_TAGS}
-    untagged = 0
-    for _, txt in rows:
-        found = extract_note_tags(txt)
-        if found:
-            for tag in found:
-                counts[tag] += 1
-        else:
-            untagged += 1
-
-    total = len(rows)
     tagged_total = sum(counts.values())
     lines = [
         f"🏷️ Tag Summary ({fmt_day_ddmmyyyy(p.start)} → {fmt_day_ddmmyyyy(p.end)})\n",
@@ -3315,33 +3830,30 @@ async def staffnotes_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except:
         await update.message.reply_text("Usage: /staffnotes  or  /staffnotes 60")
         return
-    rows = notes_in_period(p)
-    if not rows:
-        await update.message.reply_text("No notes found for that period yet.")
+    total, n_tagged, tagged, keyword_matches = await asyncio.to_thread(staff_notes_in_period, p)
+    if not total:
+        await update.message.reply_text(NO_NOTES_TEXT)
         return
 
-    tagged = [(d, txt) for d, txt in rows if "STAFF" in extract_note_tags(txt)]
-    if not tagged:
+    if not n_tagged:
         await update.message.reply_text(
             f"No [STAFF] tagged notes in the last period.\n"
             f"(keyword fallback — consider using [STAFF] tags)\n\n"
-            + _keyword_staff_fallback(rows)
+            + _keyword_staff_fallback(keyword_matches)
         )
         return
 
-    lines = [f"👥 Staff Notes ({len(tagged)} entries)\n"]
-    for d, txt in tagged[-10:]:
+    lines = [f"👥 Staff Notes ({n_tagged} entries)\n"]
+    for d, txt in tagged:
         content = extract_tag_content(txt, "STAFF")
         lines.append(f"📆 {fmt_day_ddmmyyyy(d)}: {content[:120]}")
     await update.message.reply_text("\n".join(lines))
 
-def _keyword_staff_fallback(rows: list[tuple]) -> str:
-    keywords = ["staff", "personal", "sick", "enfermo", "ausente", "absent", "late", "tarde"]
-    matches = [(d, txt) for d, txt in rows if any(k in (txt or "").lower() for k in keywords)]
+def _keyword_staff_fallback(matches: list[tuple]) -> str:
     if not matches:
         return "(no staff-related notes found via keywords either)"
     lines = []
-    for d, txt in matches[-5:]:
+    for d, txt in matches:
         lines.append(f"📆 {fmt_day_ddmmyyyy(d)}: {txt[:120]}")
     return "\n".join(lines)
 
@@ -3355,35 +3867,27 @@ def _fmt_snapshot(day_: date, label: str) -> str:
      dinner_sales, dinner_pax, dinner_walkins, dinner_noshows,
      z_total_sales, _transferencia, event_pax, event_menu_total,
      event_timeframe, _venue_fee, event_in_cm) = row
-    z = float(z_total_sales or 0)
-    total_sales = z if z > 0 else float(total_sales or 0)
-    lp = int(lunch_pax or 0)
-    dp = int(dinner_pax or 0)
-    ep = int(event_pax or 0)
-    in_cm = bool(event_in_cm) if event_in_cm is not None else True
-    covers = lp + dp + (0 if in_cm else ep)
+    if z_total_sales > 0:
+        total_sales = z_total_sales
+    covers = lunch_pax + dinner_pax + (0 if event_in_cm else event_pax)
     rls, rlc, rds, rdc = _regular_shift_metrics(
-        lunch_sales, lp, dinner_sales, dp,
-        ep, event_menu_total, event_timeframe, in_cm,
+        lunch_sales, lunch_pax, dinner_sales, dinner_pax,
+        event_pax, event_menu_total, event_timeframe, event_in_cm,
     )
     reg_covers = rlc + rdc
     avg_ticket = (rls + rds) / reg_covers if reg_covers else 0.0
-    lunch_pax = lp
-    dinner_pax = dp
-    lunch_sales = float(lunch_sales or 0)
-    dinner_sales = float(dinner_sales or 0)
     lunch_avg = rls / rlc if rlc else 0.0
     dinner_avg = rds / rdc if rdc else 0.0
     return (
         f"📊 Norah — {label} ({fmt_day_ddmmyyyy(day_)})\n\n"
         f"💰 Sales: €{total_sales:.2f}\n"
-        f"   Visa: €{float(visa or 0):.2f}  |  Cash: €{float(cash or 0):.2f}\n"
-        f"   Tips: €{float(tips or 0):.2f}\n\n"
+        f"   Visa: €{visa:.2f}  |  Cash: €{cash:.2f}\n"
+        f"   Tips: €{tips:.2f}\n\n"
         f"👥 Covers: {covers}  |  Avg ticket: €{avg_ticket:.2f}\n\n"
         f"🌞 Lunch: €{lunch_sales:.2f}  |  {lunch_pax} pax  |  Avg €{lunch_avg:.2f}\n"
-        f"   Walk-ins: {int(lunch_walkins or 0)}  |  No-shows: {int(lunch_noshows or 0)}\n\n"
+        f"   Walk-ins: {lunch_walkins}  |  No-shows: {lunch_noshows}\n\n"
         f"🌙 Dinner: €{dinner_sales:.2f}  |  {dinner_pax} pax  |  Avg €{dinner_avg:.2f}\n"
-        f"   Walk-ins: {int(dinner_walkins or 0)}  |  No-shows: {int(dinner_noshows or 0)}"
+        f"   Walk-ins: {dinner_walkins}  |  No-shows: {dinner_noshows}"
     )
 
 def _sum_period_rows(rows: list[dict]) -> dict:
@@ -3437,12 +3941,12 @@ def _last_monday(d: date) -> date:
 async def today_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
         return
-    await update.message.reply_text(_fmt_snapshot(business_day_today(), "Today"))
+    await update.message.reply_text(await asyncio.to_thread(_fmt_snapshot, business_day_today(), "Today"))
 
 async def yesterday_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
         return
-    await update.message.reply_text(_fmt_snapshot(previous_business_day(), "Yesterday"))
+    await update.message.reply_text(await asyncio.to_thread(_fmt_snapshot, previous_business_day(), "Yesterday"))
 
 async def dow_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not allow_sales_cmd(update):
@@ -3458,7 +3962,7 @@ async def dow_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     weekday = today.isoweekday()
     day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
     day_name = day_names[weekday - 1]
-    rows = get_full_days_for_weekday(weekday, today, n + 1)
+    rows = await asyncio.to_thread(get_full_days_for_weekday, weekday, today, n + 1)
     if not rows:
         await update.message.reply_text(f"No {day_name} data found yet.")
         return
@@ -3479,8 +3983,9 @@ async def weekcompare_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     last_mon = this_mon - timedelta(days=7)
     last_equiv = today - timedelta(days=7)
 
-    rows_this = get_full_days_in_period(Period(this_mon, today))
-    rows_last = get_full_days_in_period(Period(last_mon, last_equiv))
+    rows_this, rows_last = await asyncio.to_thread(
+        get_full_days_in_periods, [Period(this_mon, today), Period(last_mon, last_equiv)]
+    )
     a = _sum_period_rows(rows_this)
     b = _sum_period_rows(rows_last)
 
@@ -3519,8 +4024,9 @@ async def monthcompare_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     last_start = add_months(this_start, -1)
     last_equiv = add_months(today, -1)
 
-    rows_this = get_full_days_in_period(Period(this_start, today))
-    rows_last = get_full_days_in_period(Period(last_start, last_equiv))
+    rows_this, rows_last = await asyncio.to_thread(
+        get_full_days_in_periods, [Period(this_start, today), Period(last_start, last_equiv)]
+    )
     a = _sum_period_rows(rows_this)
     b = _sum_period_rows(rows_last)
 
@@ -3561,10 +4067,9 @@ async def weekendcompare_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE)
     prev_sat = last_sat - timedelta(days=7)
     prev_fri = prev_sat - timedelta(days=1)
 
-    rows_a = get_full_days_for_dates([last_fri, last_sat])
-    rows_b = get_full_days_for_dates([prev_fri, prev_sat])
-    a = _sum_period_rows(list(rows_a.values()))
-    b = _sum_period_rows(list(rows_b.values()))
+    rows = await asyncio.to_thread(get_full_days_for_dates, [last_fri, last_sat, prev_fri, prev_sat])
+    a = _sum_period_rows([rows[d] for d in (last_fri, last_sat) if d in rows])
+    b = _sum_period_rows([rows[d] for d in (prev_fri, prev_sat) if d in rows])
 
     msg = (
         f"📊 Weekend Comparison (Fri + Sat)\n\n"
@@ -3606,7 +4111,7 @@ async def weekdaymix_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     today = business_day_today()
     start = today - timedelta(weeks=n_weeks)
     p = Period(start, today)
-    rows = get_full_days_in_period(p)
+    rows = await asyncio.to_thread(get_full_days_in_period, p)
     if not rows:
         await update.message.reply_text(f"No data found in the last {n_weeks} weeks.")
         return
@@ -3649,7 +4154,7 @@ async def noshowrate_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     today = business_day_today()
     start = today - timedelta(weeks=n_weeks)
     p = Period(start, today)
-    rows = get_full_days_in_period(p)
+    rows = await asyncio.to_thread(get_full_days_in_period, p)
     if not rows:
         await update.message.reply_text(f"No data found in the last {n_weeks} weeks.")
         return
@@ -3743,23 +4248,65 @@ async def confirmfull(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("No guided preview to confirm. Use /setfullguided.")
         return
     d = st["data"]
-    covers = int(d["lunch_pax"] + d["dinner_pax"])
-    upsert_full_day(
-        d["day"],
-        d["total_sales"], d["visa"], d["cash"], d["tips"],
-        d["lunch_sales"], d["lunch_pax"], d["lunch_walkins"], d["lunch_noshows"],
-        d["dinner_sales"], d["dinner_pax"], d["dinner_walkins"], d["dinner_noshows"],
-    )
-    upsert_daily(d["day"], float(d["total_sales"]), covers)
+    await asyncio.to_thread(save_full_report, d)
     clear_mode(context.application, GUIDED_FULL_KEY, chat.id, user.id)
     await update.message.reply_text(f"✅ Saved full daily report for {d['day'].isoformat()}.")
 
 # =========================
 # Owners post builder + scheduled post
 # =========================
+# Both data branches (manual full report, Agora + CoverManager) share one
+# layout; the no-data post keeps the same lines with dashes.
+_OWNERS_POST_TEMPLATE = (
+    "📌 Norah Daily Post\n"
+    "Day: {day}\n"
+    "Total Sales Day: {total}{agora_tag}\n"
+    "{transferencia_subtitle}"
+    "Total Covers: {covers}  |  Avg Ticket: {avg}\n\n"
+    "Visa: {visa}\n"
+    "Cash: {cash}\n"
+    "{transferencia_payment}"
+    "Tips: {tips}\n\n"
+    "Lunch: {lunch}\n"
+    "Pax: {lunch_pax}\n"
+    "Avg Ticket: {lunch_avg}\n"
+    "Walk in: {lunch_walkins}\n"
+    "No show: {lunch_noshows}\n\n"
+    "Dinner: {dinner}\n"
+    "Pax: {dinner_pax}\n"
+    "Avg Ticket: {dinner_avg}\n"
+    "Walk in: {dinner_walkins}\n"
+    "No show: {dinner_noshows}\n\n"
+    "{event_block}"
+    "📝 Notes:\n{notes_block}"
+)
+
+_OWNERS_POST_EMPTY_TEMPLATE = (
+    "📌 Norah Daily Post\n"
+    "Day: {day}\n"
+    "Total Sales Day: —\n"
+    "Total Covers: —  |  Avg Ticket: —\n\n"
+    "Visa: —\n"
+    "Cash: —\n"
+    "Tips: —\n\n"
+    "Lunch: —\n"
+    "Pax: —\n"
+    "Avg Ticket: —\n"
+    "Walk in: —\n"
+    "No show: —\n\n"
+    "Dinner: —\n"
+    "Pax: —\n"
+    "Avg Ticket: —\n"
+    "Walk in: —\n"
+    "No show: —\n\n"
+    "📝 Notes:\n{notes_block}"
+)
+
 def build_owners_post_for_day(report_day: date, dry_run: bool = False) -> str:
-    full_row = None if dry_run else get_full_day(report_day)
-    notes_texts = notes_for_day(report_day)
+    if dry_run:
+        full_row, notes_texts = None, notes_for_day(report_day)
+    else:
+        full_row, notes_texts = get_full_day_and_notes(report_day)
 
     notes_block = "No notes submitted."
     if notes_texts:
@@ -3774,27 +4321,24 @@ def build_owners_post_for_day(report_day: date, dry_run: bool = False) -> str:
             event_timeframe, venue_fee, event_in_cm,
         ) = full_row
 
-        lp = int(lunch_pax or 0)
-        dp = int(dinner_pax or 0)
-        ep = int(event_pax or 0)
-        in_cm = bool(event_in_cm) if event_in_cm is not None else True
-        z = float(z_total_sales or 0)
-        emt = float(event_menu_total or 0)
-        vf  = float(venue_fee or 0)
-        tr  = float(transferencia or 0)
+        lp, dp, ep = lunch_pax, dinner_pax, event_pax
+        z = z_total_sales
+        emt = event_menu_total
+        vf  = venue_fee
+        tr  = transferencia
 
-        display_total = z if z > 0 else float(total_sales or 0)
+        display_total = z if z > 0 else total_sales
         agora_tag = " *(Agora POS)*" if z > 0 else ""
 
         has_event = emt > 0
-        etf_lower = (event_timeframe or "").lower()
+        etf_lower = event_timeframe.lower()
         is_lunch_event  = has_event and any(w in etf_lower for w in ("mediodía", "mediodia", "tarde"))
         is_dinner_event = has_event and ("noche" in etf_lower or "cena" in etf_lower)
 
-        display_lunch  = float(lunch_sales or 0) - emt if is_lunch_event  else float(lunch_sales or 0)
-        display_dinner = float(dinner_sales or 0) - emt if is_dinner_event else float(dinner_sales or 0)
+        display_lunch  = lunch_sales - emt if is_lunch_event  else lunch_sales
+        display_dinner = dinner_sales - emt if is_dinner_event else dinner_sales
 
-        total_covers = lp + dp + (0 if in_cm else ep)
+        total_covers = lp + dp + (0 if event_in_cm else ep)
         regular_consumption = (display_lunch + display_dinner) if has_event else display_total
         total_avg  = round(regular_consumption / total_covers, 2) if total_covers else 0.0
         lunch_avg  = round(display_lunch  / lp, 2) if lp else 0.0
@@ -3804,13 +4348,14 @@ def build_owners_post_for_day(report_day: date, dry_run: bool = False) -> str:
         cash_str = euro_comma(cash) if cash else "—"
         tips_str = euro_comma(tips) if tips else "—"
 
+        tr_str = euro_comma(tr) if tr > 0 else ""
         # (A) "Of which Transferencia" subtitle
         transferencia_subtitle = (
-            f"Of which Transferencia: {euro_comma(tr)} (event)\n" if tr > 0 else ""
+            f"Of which Transferencia: {tr_str} (event)\n" if tr > 0 else ""
         )
         # (B) Transferencia payment line
         transferencia_payment = (
-            f"Transferencia: {euro_comma(tr)}\n" if tr > 0 else ""
+            f"Transferencia: {tr_str}\n" if tr > 0 else ""
         )
         # (C) Event block
         if has_event:
@@ -3825,29 +4370,30 @@ def build_owners_post_for_day(report_day: date, dry_run: bool = False) -> str:
         else:
             event_block = ""
 
-        msg = (
-            f"📌 Norah Daily Post\n"
-            f"Day: {fmt_day_ddmmyyyy(report_day)}\n"
-            f"Total Sales Day: {euro_comma(display_total)}{agora_tag}\n"
-            f"{transferencia_subtitle}"
-            f"Total Covers: {total_covers}  |  Avg Ticket: {euro_comma(total_avg)}\n\n"
-            f"Visa: {visa_str}\n"
-            f"Cash: {cash_str}\n"
-            f"{transferencia_payment}"
-            f"Tips: {tips_str}\n\n"
-            f"Lunch: {euro_comma(display_lunch)}\n"
-            f"Pax: {lp}\n"
-            f"Avg Ticket: {euro_comma(lunch_avg)}\n"
-            f"Walk in: {int(lunch_walkins or 0)}\n"
-            f"No show: {int(lunch_noshows or 0)}\n\n"
-            f"Dinner: {euro_comma(display_dinner)}\n"
-            f"Pax: {dp}\n"
-            f"Avg Ticket: {euro_comma(dinner_avg)}\n"
-            f"Walk in: {int(dinner_walkins or 0)}\n"
-            f"No show: {int(dinner_noshows or 0)}\n\n"
-            f"{event_block}"
-            f"📝 Notes:\n{notes_block}"
-        )
+        msg = _OWNERS_POST_TEMPLATE.format_map({
+            "day": fmt_day_ddmmyyyy(report_day),
+            "total": euro_comma(display_total),
+            "agora_tag": agora_tag,
+            "transferencia_subtitle": transferencia_subtitle,
+            "covers": total_covers,
+            "avg": euro_comma(total_avg),
+            "visa": visa_str,
+            "cash": cash_str,
+            "transferencia_payment": transferencia_payment,
+            "tips": tips_str,
+            "lunch": euro_comma(display_lunch),
+            "lunch_pax": lp,
+            "lunch_avg": euro_comma(lunch_avg),
+            "lunch_walkins": lunch_walkins,
+            "lunch_noshows": lunch_noshows,
+            "dinner": euro_comma(display_dinner),
+            "dinner_pax": dp,
+            "dinner_avg": euro_comma(dinner_avg),
+            "dinner_walkins": dinner_walkins,
+            "dinner_noshows": dinner_noshows,
+            "event_block": event_block,
+            "notes_block": notes_block,
+        })
     else:
         # No manual entry — pull from Agora (revenue) + CoverManager (pax/walkins/noshows).
         agora = _try_agora(report_day)
@@ -3888,14 +4434,15 @@ def build_owners_post_for_day(report_day: date, dry_run: bool = False) -> str:
             tips_str = euro_comma(agora.tips) if agora.tips else "—"
 
             # ── Conditional fragments ─────────────────────────────────────────
+            tr_str = euro_comma(agora.transferencia) if agora.transferencia > 0 else ""
             # (A) "Of which Transferencia" subtitle under Total Sales Day
             transferencia_subtitle = (
-                f"Of which Transferencia: {euro_comma(agora.transferencia)} (event)\n"
+                f"Of which Transferencia: {tr_str} (event)\n"
                 if agora.transferencia > 0 else ""
             )
             # (B) Transferencia payment line between Cash and Tips
             transferencia_payment = (
-                f"Transferencia: {euro_comma(agora.transferencia)}\n"
+                f"Transferencia: {tr_str}\n"
                 if agora.transferencia > 0 else ""
             )
             # (C) Event block between Dinner and Notes
@@ -3937,54 +4484,39 @@ def build_owners_post_for_day(report_day: date, dry_run: bool = False) -> str:
                     except Exception as e:
                         print(f"[daily_post] aggregation upsert failed for {report_day}: {e}")
 
-            msg = (
-                f"📌 Norah Daily Post\n"
-                f"Day: {fmt_day_ddmmyyyy(report_day)}\n"
-                f"Total Sales Day: {euro_comma(display_total)} *(Agora POS)*\n"
-                f"{transferencia_subtitle}"
-                f"Total Covers: {total_covers}  |  Avg Ticket: {euro_comma(total_avg)}\n\n"
-                f"Visa: {visa_str}\n"
-                f"Cash: {cash_str}\n"
-                f"{transferencia_payment}"
-                f"Tips: {tips_str}\n\n"
-                f"Lunch: {euro_comma(display_lunch)}\n"
-                f"Pax: {cm['lunch_pax']}\n"
-                f"Avg Ticket: {euro_comma(lunch_avg)}\n"
-                f"Walk in: {cm['lunch_walkins']}\n"
-                f"No show: {cm['lunch_noshows']}\n\n"
-                f"Dinner: {euro_comma(display_dinner)}\n"
-                f"Pax: {cm['dinner_pax']}\n"
-                f"Avg Ticket: {euro_comma(dinner_avg)}\n"
-                f"Walk in: {cm['dinner_walkins']}\n"
-                f"No show: {cm['dinner_noshows']}\n\n"
-                f"{event_block}"
-                f"📝 Notes:\n{notes_block}"
-            )
+            msg = _OWNERS_POST_TEMPLATE.format_map({
+                "day": fmt_day_ddmmyyyy(report_day),
+                "total": euro_comma(display_total),
+                "agora_tag": " *(Agora POS)*",
+                "transferencia_subtitle": transferencia_subtitle,
+                "covers": total_covers,
+                "avg": euro_comma(total_avg),
+                "visa": visa_str,
+                "cash": cash_str,
+                "transferencia_payment": transferencia_payment,
+                "tips": tips_str,
+                "lunch": euro_comma(display_lunch),
+                "lunch_pax": cm["lunch_pax"],
+                "lunch_avg": euro_comma(lunch_avg),
+                "lunch_walkins": cm["lunch_walkins"],
+                "lunch_noshows": cm["lunch_noshows"],
+                "dinner": euro_comma(display_dinner),
+                "dinner_pax": cm["dinner_pax"],
+                "dinner_avg": euro_comma(dinner_avg),
+                "dinner_walkins": cm["dinner_walkins"],
+                "dinner_noshows": cm["dinner_noshows"],
+                "event_block": event_block,
+                "notes_block": notes_block,
+            })
         else:
-            msg = (
-                f"📌 Norah Daily Post\n"
-                f"Day: {fmt_day_ddmmyyyy(report_day)}\n"
-                f"Total Sales Day: —\n"
-                f"Total Covers: —  |  Avg Ticket: —\n\n"
-                f"Visa: —\n"
-                f"Cash: —\n"
-                f"Tips: —\n\n"
-                f"Lunch: —\n"
-                f"Pax: —\n"
-                f"Avg Ticket: —\n"
-                f"Walk in: —\n"
-                f"No show: —\n\n"
-                f"Dinner: —\n"
-                f"Pax: —\n"
-                f"Avg Ticket: —\n"
-                f"Walk in: —\n"
-                f"No show: —\n\n"
-                f"📝 Notes:\n{notes_block}"
-            )
+            msg = _OWNERS_POST_EMPTY_TEMPLATE.format_map({
+                "day": fmt_day_ddmmyyyy(report_day),
+                "notes_block": notes_block,
+            })
     return msg
 
 async def send_daily_post_to_owners(context: ContextTypes.DEFAULT_TYPE):
-    chats = owners_silent_chat_ids()
+    chats = await asyncio.to_thread(owners_silent_chat_ids)
     if not chats:
         return
     report_day = previous_business_day(now_local())
@@ -3993,17 +4525,13 @@ async def send_daily_post_to_owners(context: ContextTypes.DEFAULT_TYPE):
             print(f"[daily_post] Monday skip — Saturday {(report_day - timedelta(days=1)).isoformat()} already posted on Sunday")
             return
         saturday = report_day - timedelta(days=1)
-        if get_full_day(saturday) is None:
+        if await asyncio.to_thread(get_full_day, saturday) is None:
             print(f"[daily_post] Sunday skip — no Saturday data for {saturday.isoformat()}, skipping")
             return
         print(f"[daily_post] Sunday skip — posting Saturday {saturday.isoformat()} instead")
         report_day = saturday
-    msg = build_owners_post_for_day(report_day)
-    for chat_id in chats:
-        try:
-            await context.bot.send_message(chat_id=chat_id, text=msg)
-        except Exception as e:
-            print(f"Daily post send failed for chat {chat_id}: {e}")
+    msg = await asyncio.to_thread(build_owners_post_for_day, report_day)
+    await broadcast_text(context.bot, chats, msg, label="Daily post")
 
 def _booking_sources_block(from_date: date, to_date: date) -> str:
     """
@@ -4025,7 +4553,6 @@ def _booking_sources_block(from_date: date, to_date: date) -> str:
     # but get_reservations_range doesn't expose raw records. Re-fetch raw via the module.
     try:
         import urllib.request as _ur, json as _json
-        from collections import Counter as _Counter
 
         base = _cm_mod.COVERMANAGER_BASE
         key  = _cm_mod.COVERMANAGER_API_KEY
@@ -4051,29 +4578,7 @@ def _booking_sources_block(from_date: date, to_date: date) -> str:
             return ""
 
         # Classify each record into a human-readable channel
-        channels = _Counter()
-        for r in all_records:
-            origin = (r.get("origin") or "").strip().lower()
-            prov   = (r.get("provenance") or "").strip().lower()
-
-            if prov == "walk in":
-                channels["Walk-in"] += 1
-            elif "instagram" in origin:
-                channels["Instagram"] += 1
-            elif origin == "google":
-                channels["Google"] += 1
-            elif prov == "moduloweb":
-                channels["Own website"] += 1
-            elif prov == "app-movil":
-                channels["Mobile app"] += 1
-            elif prov == "waitinglist":
-                channels["Waiting list"] += 1
-            elif prov == "software":
-                channels["Staff/software"] += 1
-            elif prov == "terceros":
-                channels["Third-party"] += 1
-            else:
-                channels["Other"] += 1
+        channels = Counter(map(_classify_channel, all_records))
 
         total = sum(channels.values())
         lines = [f"\n📍 Booking Sources (this week, {total} total)"]
@@ -4087,23 +4592,31 @@ def _booking_sources_block(from_date: date, to_date: date) -> str:
         return ""
 
 
-async def send_weekly_digest(context: ContextTypes.DEFAULT_TYPE):
-    chats = owners_silent_chat_ids()
-    if not chats:
-        return
-
-    # Job fires on Monday — last week = Mon to Sun
-    today = datetime.now(TZ).date()
-    last_monday = today - timedelta(days=7)
-    last_sunday = today - timedelta(days=1)
-    prev_monday = today - timedelta(days=14)
-    prev_sunday = today - timedelta(days=8)
-
-    p_this = Period(start=last_monday, end=last_sunday)
-    p_prev = Period(start=prev_monday, end=prev_sunday)
-
-    agg = sum_full_in_period(p_this)
-    agg_prev = sum_full_in_period(p_prev)
+# Rendered digests keyed by (week start, week end). Re-runs and retries
+# within the TTL reuse the text, including the CoverManager booking sources;
+# invalidate_daily_aggregates() drops entries whose two weeks cover a write.
+# Shares _DAILY_AGG_LOCK and the generation check with the aggregate cache.
+WEEKLY_DIGEST_CACHE_TTL_SECONDS = 600.0
+_WEEKLY_DIGEST_CACHE: dict[tuple[date, date], tuple[float, str]] = {}
+
+async def compute_weekly_digest_text(p_this: Period, p_prev: Period) -> str:
+    """Owners digest for week p_this compared with p_prev."""
+    key = (p_this.start, p_this.end)
+    with _DAILY_AGG_LOCK:
+        hit = _WEEKLY_DIGEST_CACHE.get(key)
+    if hit is not None and time_mod.monotonic() < hit[0]:
+        return hit[1]
+    gen = _agg_cache_gen()
+
+    last_monday, last_sunday = p_this.start, p_this.end
+    prev_monday, prev_sunday = p_prev.start, p_prev.end
+
+    # Both weeks' aggregates come back from one query; the CoverManager
+    # booking sources are independent, so fetch them concurrently.
+    (agg, agg_prev), sources_block = await asyncio.gather(
+        asyncio.to_thread(sum_full_in_periods, [p_this, p_prev]),
+        asyncio.to_thread(_booking_sources_block, last_monday, last_sunday),
+    )
 
     def _diff(new, old):
         if old == 0:
@@ -4174,15 +4687,32 @@ async def send_weekly_digest(context: ContextTypes.DEFAULT_TYPE):
         f"  (prev: {prev_walkins})"
     )
 
-    sources_block = _booking_sources_block(last_monday, last_sunday)
     if sources_block:
         msg += sources_block
 
-    for chat_id in chats:
-        try:
-            await context.bot.send_message(chat_id=chat_id, text=msg)
-        except Exception as e:
-            print(f"Weekly digest send failed for chat {chat_id}: {e}")
+    with _DAILY_AGG_LOCK:
+        if gen == _DAILY_AGG_GEN:
+            _WEEKLY_DIGEST_CACHE[key] = (time_mod.monotonic() + WEEKLY_DIGEST_CACHE_TTL_SECONDS, msg)
+    return msg
+
+async def send_weekly_digest(context: ContextTypes.DEFAULT_TYPE):
+    chats = await asyncio.to_thread(owners_silent_chat_ids)
+    if not chats:
+        return
+
+    # Job fires on Monday — last week = Mon to Sun
+    today = datetime.now(TZ).date()
+    p_this = Period(start=today - timedelta(days=7), end=today - timedelta(days=1))
+    p_prev = Period(start=today - timedelta(days=14), end=today - timedelta(days=8))
+
+    # A closed week has nothing to compare: skip the aggregates and the
+    # CoverManager fetch instead of posting a digest of zeros.
+    if not await asyncio.to_thread(full_days_exist_in_period, p_this):
+        print(f"[weekly_digest] skip — no full reports for {p_this.start.isoformat()} – {p_this.end.isoformat()}")
+        return
+
+    msg = await compute_weekly_digest_text(p_this, p_prev)
+    await broadcast_text(context.bot, chats, msg, label="Weekly digest")
 
 # =========================
 # ADMIN: /postday
@@ -4204,19 +4734,13 @@ async def postday(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"⚠️ {d.isoformat()} is a Sunday — Norah is closed, no post to send.")
         return
 
-    chats = owners_silent_chat_ids()
+    chats = await asyncio.to_thread(owners_silent_chat_ids)
     if not chats:
         await update.message.reply_text("No Owners Silent chats registered. Use /setowners or /setchatrole OWNERS_SILENT.")
         return
 
-    msg = build_owners_post_for_day(d)
-    sent = 0
-    for chat_id in chats:
-        try:
-            await context.bot.send_message(chat_id=chat_id, text=msg)
-            sent += 1
-        except Exception as e:
-            print(f"postday send failed for chat {chat_id}: {e}")
+    msg = await asyncio.to_thread(build_owners_post_for_day, d)
+    sent = await broadcast_text(context.bot, chats, msg, label="postday")
 
     await update.message.reply_text(f"✅ Posted owners report for {d.isoformat()} to {sent} owners chat(s).")
 
@@ -4224,17 +4748,26 @@ async def postday(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # TEXT HANDLER
 # =========================
 async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message:
-        return
+    # Fires for every group message: resolve the update's properties once.
+    message = update.message
     chat = update.effective_chat
     user = update.effective_user
-    if not chat or not user:
+    if not message or not chat or not user:
         return
-    msg_text = (update.message.text or "").strip()
+    msg_text = (message.text or "").strip()
     if not msg_text:
         return
+    app = context.application
+    cid = chat.id
+    uid = user.id
 
-    role = get_chat_role(chat.id)
+    role = get_chat_role(cid)
+
+    # Owners' silent group: only admins can start /report or /setfull modes
+    # there, so everyone else gets the reminder without any mode lookups.
+    if role == ROLE_OWNERS_SILENT and not user.is_bot and not is_admin(update):
+        await _remind_owners_silent(message)
+        return
 
     # ---------------------------------------------------------
     # Auto-save FULL daily report (no /setfull) in OPS_ADMIN/MANAGER_INPUT
@@ -4250,18 +4783,11 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if looks_full:
             try:
                 d = parse_full_report_block(msg_text)
-                covers = int(d["lunch_pax"] + d["dinner_pax"])
-                upsert_full_day(
-                    d["day"],
-                    d["total_sales"], d["visa"], d["cash"], d["tips"],
-                    d["lunch_sales"], d["lunch_pax"], d["lunch_walkins"], d["lunch_noshows"],
-                    d["dinner_sales"], d["dinner_pax"], d["dinner_walkins"], d["dinner_noshows"],
-                )
-                upsert_daily(d["day"], float(d["total_sales"]), covers)
-                await update.message.reply_text(f"✅ Saved full daily report for {d['day'].isoformat()}.")
+                await asyncio.to_thread(save_full_report, d)
+                await message.reply_text(f"✅ Saved full daily report for {d['day'].isoformat()}.")
                 return
             except:
-                await update.message.reply_text(
+                await message.reply_text(
                     "❌ This looks like a full daily report, but I couldn't parse it.\n\n"
                     "Please paste it in this exact format (English or Spanish labels are OK):\n\n"
                     f"{FULL_EXAMPLE}"
@@ -4271,10 +4797,10 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ---------------------------------------------------------
     # Guided full flow
     # ---------------------------------------------------------
-    st = get_mode(context.application, GUIDED_FULL_KEY, chat.id, user.id)
+    st = get_mode(app, GUIDED_FULL_KEY, cid, uid)
     if st and st.get("on"):
         if st.get("awaiting_confirm"):
-            await update.message.reply_text("Please confirm with /confirmfull or cancel with /cancelfull.")
+            await message.reply_text("Please confirm with /confirmfull or cancel with /cancelfull.")
             return
 
         step = int(st.get("step", 0))
@@ -4289,7 +4815,7 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             else:
                 data[field] = _int(msg_text)
         except:
-            await update.message.reply_text(f"Couldn't understand '{msg_text}'. Try again.\n\n{question}")
+            await message.reply_text(f"Couldn't understand '{msg_text}'. Try again.\n\n{question}")
             return
 
         step += 1
@@ -4306,9 +4832,9 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             tips_pct = (data["tips"] / data["total_sales"] * 100.0) if data["total_sales"] else 0.0
 
             st["awaiting_confirm"] = True
-            set_mode(context.application, GUIDED_FULL_KEY, chat.id, user.id, st)
+            set_mode(app, GUIDED_FULL_KEY, cid, uid, st)
 
-            await update.message.reply_text(
+            await message.reply_text(
                 "📌 Full Day Preview\n"
                 f"Day: {data['day'].isoformat()}\n\n"
                 f"Total sales: €{data['total_sales']:.2f}\n"
@@ -4323,34 +4849,27 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        set_mode(context.application, GUIDED_FULL_KEY, chat.id, user.id, st)
-        await update.message.reply_text(f"Q{step+1}) {GUIDED_STEPS[step][1]}")
+        set_mode(app, GUIDED_FULL_KEY, cid, uid, st)
+        await message.reply_text(f"Q{step+1}) {GUIDED_STEPS[step][1]}")
         return
 
     # ---------------------------------------------------------
     # Paste full report flow (legacy /setfull)
     # ---------------------------------------------------------
-    fm = get_mode(context.application, FULL_MODE_KEY, chat.id, user.id)
+    fm = get_mode(app, FULL_MODE_KEY, cid, uid)
     if fm and fm.get("on"):
         try:
             d = parse_full_report_block(msg_text)
         except:
-            await update.message.reply_text(
+            await message.reply_text(
                 "❌ I couldn't parse that report. Please paste again in this format:\n\n"
                 f"{FULL_EXAMPLE}\n"
                 "To cancel: /cancelfull"
             )
             return
-        covers = int(d["lunch_pax"] + d["dinner_pax"])
-        upsert_full_day(
-            d["day"],
-            d["total_sales"], d["visa"], d["cash"], d["tips"],
-            d["lunch_sales"], d["lunch_pax"], d["lunch_walkins"], d["lunch_noshows"],
-            d["dinner_sales"], d["dinner_pax"], d["dinner_walkins"], d["dinner_noshows"],
-        )
-        upsert_daily(d["day"], float(d["total_sales"]), covers)
-        clear_mode(context.application, FULL_MODE_KEY, chat.id, user.id)
-        await update.message.reply_text(f"✅ Saved full daily report for {d['day'].isoformat()}.")
+        await asyncio.to_thread(save_full_report, d)
+        clear_mode(app, FULL_MODE_KEY, cid, uid)
+        await message.reply_text(f"✅ Saved full daily report for {d['day'].isoformat()}.")
         return
 
     # ---------------------------------------------------------
@@ -4359,24 +4878,24 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if role == ROLE_MANAGER_INPUT and not user.is_bot:
         if looks_like_notes_report(msg_text):
             d = extract_day_from_notes(msg_text) or business_day_today()
-            insert_note_entry(d, chat.id, user.id, msg_text)
+            await asyncio.to_thread(insert_note_entry, d, cid, uid, msg_text)
             detected = extract_note_tags(msg_text)
             tag_line = f"\nTags detected: {', '.join(detected)}" if detected else ""
-            await update.message.reply_text(f"Saved 📝 Notes for business day {d.isoformat()}.{tag_line}")
+            await message.reply_text(f"Saved 📝 Notes for business day {d.isoformat()}.{tag_line}")
             return
 
     # ---------------------------------------------------------
     # Notes capture (legacy /report mode)
     # ---------------------------------------------------------
-    rm = get_mode(context.application, REPORT_MODE_KEY, chat.id, user.id)
+    rm = get_mode(app, REPORT_MODE_KEY, cid, uid)
     if rm and rm.get("on"):
         day_str = rm.get("day")
         day_ = parse_yyyy_mm_dd(day_str) if day_str else business_day_today()
-        insert_note_entry(day_, chat.id, user.id, msg_text)
-        clear_mode(context.application, REPORT_MODE_KEY, chat.id, user.id)
+        await asyncio.to_thread(insert_note_entry, day_, cid, uid, msg_text)
+        clear_mode(app, REPORT_MODE_KEY, cid, uid)
         detected = extract_note_tags(msg_text)
         tag_line = f"\nTags detected: {', '.join(detected)}" if detected else ""
-        await update.message.reply_text(f"Saved 📝 Notes for business day {day_.isoformat()}.{tag_line}")
+        await message.reply_text(f"Saved 📝 Notes for business day {day_.isoformat()}.{tag_line}")
         return
 
     # ---------------------------------------------------------
@@ -4387,16 +4906,19 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Keep owners silent clean
-    if get_chat_role(chat.id) == ROLE_OWNERS_SILENT and not user.is_bot:
-        try:
-            await update.message.reply_text(
-                "🧾 This is the silent Owners group.\nPlease post requests in *Norah Owners Requests*.",
-                parse_mode="Markdown",
-            )
-        except:
-            pass
+    if role == ROLE_OWNERS_SILENT and not user.is_bot:
+        await _remind_owners_silent(message)
         return
 
+async def _remind_owners_silent(message):
+    try:
+        await message.reply_text(
+            "🧾 This is the silent Owners group.\nPlease post requests in *Norah Owners Requests*.",
+            parse_mode="Markdown",
+        )
+    except:
+        pass
+
 # =========================
 # FLASK API
 # =========================
@@ -4697,10 +5219,10 @@ def api_booking_sources():
     all_records_no_sun = [r for r in all_records if not _is_sunday(r)]
     pie_records = [r for r in all_records_no_sun if (r.get("date") or "") >= pie_from_str]
 
-    from collections import Counter, defaultdict as _dd
+    from collections import defaultdict as _dd
 
     # ── Pie: last 30 days ────────────────────────────────────────────────────
-    pie_counts = Counter(_classify_channel(r) for r in pie_records)
+    pie_counts = Counter(map(_classify_channel, pie_records))
     pie_total  = sum(pie_counts.values())
 
     # ── Trends: last 30 days, one point per day (Sundays already removed) ────
@@ -4907,6 +5429,7 @@ def send_corrected_post():
                 cur.execute("DELETE FROM full_daily_stats WHERE day = %s;", (day_,))
                 cur.execute("DELETE FROM daily_stats WHERE day = %s;", (day_,))
             conn.commit()
+        invalidate_daily_aggregates(day_)
 
         # Build fresh post (will call _try_agora + _try_cm_covers and re-save to DB)
         body = build_owners_post_for_day(day_)
@@ -4998,6 +5521,10 @@ def admin_event_flag():
                 )
                 rowcount = cur.rowcount
             conn.commit()
+        try:
+            invalidate_daily_aggregates(date.fromisoformat(date_str))
+        except ValueError:
+            invalidate_daily_aggregates()
         return jsonify({"date": date_str, "updated": updates, "rows_updated": rowcount})
     # GET: read current value
     with get_conn() as conn:
@@ -6910,9 +7437,23 @@ def main():
     if not BOT_TOKEN:
         raise RuntimeError("Missing BOT_TOKEN")
 
+    # Fill the pool's min_size connections up front so the first commands
+    # after a restart don't each pay the TCP/TLS/auth handshake.
+    _get_pool().wait(timeout=DB_POOL_TIMEOUT)
     init_db()
 
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(True)
+        .rate_limiter(AIORateLimiter(
+            overall_max_rate=30,
+            overall_time_period=1,
+            group_max_rate=20,
+            group_time_period=60,
+        ))
+        .build()
+    )
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_cmd))
@@ -6996,9 +7537,21 @@ def main():
 
     while True:
         try:
-            print("Waiting 20s before polling...")
-            time_mod.sleep(20)
-            app.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
+            if WEBHOOK_URL:
+                print(f"Starting webhook on :{WEBHOOK_PORT}/{WEBHOOK_PATH}")
+                app.run_webhook(
+                    listen="0.0.0.0",
+                    port=WEBHOOK_PORT,
+                    url_path=WEBHOOK_PATH,
+                    webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+                    secret_token=WEBHOOK_SECRET or None,
+                    allowed_updates=Update.ALL_TYPES,
+                    drop_pending_updates=True,
+                )
+            else:
+                print("Waiting 20s before polling...")
+                time_mod.sleep(20)
+                app.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
             break
         except Exception as e:
             print(f"Bot crashed, restarting in 30s: {e}")